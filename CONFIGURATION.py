@@ -1 +1,2 @@
 SCALE = 16
+HEIGHT = 256
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+benchmarks: Dict[str, Callable[[int], Dict[str, float]]] = {}
+
+
+def benchmark(f):
+    """Registers `f(repeat)`, which returns its results as {metric: value}.
+    Metrics ending in `_per_second` are better when higher, all others (times) when lower."""
+    benchmarks[f.__name__] = f
+    return f
+
+
+def measure(f: Callable[[], None], number: int, repeat: int, setup: Callable[[], None] = None) -> float:
+    """The best time of `repeat` runs of `number` calls of `f`, per call."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        for _ in range(number):
+            f()
+        best = min(best, time.perf_counter() - t)
+    return best / number
+
+
+def _generator():
+    import mods.minecraft
+    return mods.minecraft.SimpleGenerator({"seed": 0})
+
+
+def _world(objects: int = 0):
+    from object import Object
+    from world import World
+
+    class Dummy(Object):
+        image_parts = {}
+        size = (0.75, 1.8)
+
+        def _render(self):
+            self._image = pygame.Surface((12, 29), pygame.SRCALPHA)
+            self._draw_offset = (0, -29)
+
+    world = World(_generator(), (0, -20), view_distance=32)
+    world.pregenerate(-1100, 1100)
+    rng = np.random.default_rng(0)
+    for x in rng.uniform(-1000, 1000, objects):
+        o = Dummy((float(x), 120.0))
+        world.add(o)
+        o.velocity = (rng.uniform(-3, 3), 0)
+    return world
+
+
+@benchmark
+def generator(repeat):
+    gen = None
+
+    def setup():
+        nonlocal gen
+        gen = _generator()
+
+    batch = measure(lambda: gen.generate_range(0, 1024), 1, repeat, setup)
+    single = measure(lambda: [gen(x) for x in range(0, 64)], 1, repeat, setup)
+    return {"batch_columns_per_second": 1024 / batch, "single_columns_per_second": 64 / single}
+
+
+@benchmark
+def world_update(repeat):
+    results = {}
+    for n in (1, 100, 1000):
+        world = _world(n)
+        for _ in range(60):
+            world.update(world.tick_length)
+        results[f"tick_ms_{n}_objects"] = measure(lambda: world.update(world.tick_length), 60, repeat) * 1000
+        world.close()
+    return results
+
+
+@benchmark
+def block_ticks(repeat):
+    from mods.minecraft import blocks
+    world = _world()
+    idle = measure(world.ticks.update, 600, repeat)
+    n = 200
+    start = [-1000]
+
+    def setup():
+        # sand in the air of columns that didn't have any yet, it falls a block every other tick
+        with world.edit():
+            for x in range(start[0], start[0] + n):
+                world.set_block((x, 250), blocks.Sand)
+        start[0] += n
+
+    falling = measure(world.ticks.update, 60, repeat, setup)
+    world.close()
+    return {"idle_tick_ms": idle * 1000, f"tick_ms_{n}_falling_blocks": falling * 1000}
+
+
+@benchmark
+def fluids(repeat):
+    from mods.minecraft import blocks
+    world = _world()
+    idle = measure(world.fluids.update, 600, repeat)
+    start = [-1000]
+
+    def setup():
+        # a block of water in the air, it falls down and spreads out
+        with world.edit():
+            for x in range(start[0], start[0] + 10):
+                for y in range(200, 210):
+                    world.set_block((x, y), blocks.Water)
+        start[0] += 100
+
+    interval = blocks.Water.flow_interval
+    flowing = measure(world.fluids.update, 60 * interval, repeat, setup) * interval
+    world.close()
+    return {"idle_tick_ms": idle * 1000, "flow_step_ms_100_cells": flowing * 1000}
+
+
+@benchmark
+def pathfinding(repeat):
+    world = _world()
+    paths = world.paths
+    surface = world._generator._surface(-1000, 1000)[1]
+    starts = [(x, int(surface[x + 1000]) + 1) for x in range(-900, 900, 45)]
+    pairs = list(zip(starts, starts[1:]))
+
+    def search():
+        for start, goal in pairs:
+            paths.find(start, goal)
+        paths._results.clear()
+
+    def setup():
+        paths._regions.clear()
+
+    cold = measure(search, 1, repeat, setup)
+    warm = measure(search, 1, repeat)
+    world.close()
+    return {"cold_requests_per_second": len(pairs) / cold, "cached_regions_requests_per_second": len(pairs) / warm}
+
+
+@benchmark
+def frame(repeat):
+    world = _world(50)
+    scroll = [0.0]
+
+    def image():
+        x = int(scroll[0])
+        world.image((x, x + 42), (80, 112))
+        scroll[0] += 0.25
+
+    def setup():
+        scroll[0] = -100.0
+        world.renderer.clear()
+
+    get_blocks = measure(lambda: world.get_blocks((0, 42), (80, 112)), 100, repeat)
+    scrolling = measure(image, 400, repeat, setup)
+    world.close()
+    return {"get_blocks_ms": get_blocks * 1000, "scrolling_image_ms": scrolling * 1000}
+
+
+@benchmark
+def blocks(repeat):
+    from mods.minecraft import blocks
+    from palette import Palette
+    palette = Palette()
+    n = 10000
+    construct = measure(lambda: [blocks.Stone() for _ in range(n)], 1, repeat)
+    construct_data = measure(lambda: [blocks.Dirt({"state": "coarse"}) for _ in range(n)], 1, repeat)
+    index = measure(lambda: [palette.index(blocks.Dirt, {"state": "coarse"}) for _ in range(n)], 1, repeat)
+    return {"construct_per_second": n / construct, "construct_with_data_per_second": n / construct_data,
+            "palette_index_per_second": n / index}
+
+
+@benchmark
+def geometry(repeat):
+    from util import Vec2d, Rect
+    n = 10000
+    a, b = Vec2d(1.5, 2.5), Vec2d(-3, 4)
+    r1, r2 = Rect(0, 0, 1, 2), Rect(0.5, 1, 1, 1)
+
+    def vec():
+        for _ in range(n):
+            (a + b - a) * 2
+            a.rotation
+            a.magnitude
+
+    def rect():
+        for _ in range(n):
+            r1.x += 0.1
+            r1.center = r1.center
+            r1.collide(r2)
+        r1.x = 0
+
+    return {"vec2d_ops_per_second": 5 * n / measure(vec, 1, repeat),
+            "rect_ops_per_second": 4 * n / measure(rect, 1, repeat)}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[Tuple[str, str, float, float]]:
+    """(benchmark, metric, baseline, result) of every metric that got worse by more than `tolerance`."""
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            old = baseline.get(name, {}).get(metric)
+            if old is None:
+                continue
+            if metric.endswith("_per_second"):
+                worse = value < old * (1 - tolerance)
+            else:
+                worse = value > old * (1 + tolerance)
+            if worse:
+                regressions.append((name, metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of the engine hot paths.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, all by default: {', '.join(benchmarks)}")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the best one counts")
+    parser.add_argument("--out", help="write the results as json to this file")
+    parser.add_argument("--baseline", help="json results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative slowdown, default 0.1")
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f"unknown benchmark {name!r}")
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+    results = {}
+    for name in args.names or benchmarks:
+        results[name] = benchmarks[name](args.repeat)
+        for metric, value in results[name].items():
+            print(f"{name:>14} {metric:<32} {value:14.3f}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"python": platform.python_version(), "platform": platform.platform(), "results": results},
+                      f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f"regression: {name} {metric} {old:.3f} -> {new:.3f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,40 @@
-from typing import Dict, Any
+from importlib import import_module
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Type
 
 import pygame
 
-from util import Vec2d, Rect
+from CONFIGURATION import SCALE
+from textures import block_atlas
+from util import Rect
 
 
 class Block:
+    """A block state. Instances are shared between all cells with the same class and data (see `Palette`),
+    so they don't know their position and their data can't be changed after creation."""
     image_paths = {}
     allowed_data = {}
     has_collision = True
-
-    def __init__(self, pos, data=None):
-        self.images = {}
-        for n, p in self.image_paths.items():
-            self.images[n] = pygame.image.load(p)
-        self.pos: Vec2d = Vec2d(pos)
+    light_emission = 0
+    # see `ticks.TickScheduler`
+    random_ticks = False
+    neighbor_updates = False
+    registry: Dict[str, Type["Block"]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Block.registry[cls.__module__.replace("mods.", "") + ":" + cls.__name__] = cls
+        for p in cls.image_paths.values():
+            block_atlas.add(p)
+
+    @staticmethod
+    def by_id(id: str) -> Type["Block"]:
+        """The block class with the `id`, its mod module is imported if that didn't happen yet."""
+        if id not in Block.registry:
+            import_module("mods." + id.split(":")[0])
+        return Block.registry[id]
+
+    def __init__(self, data=None):
         self._data: Dict[str, Any] = None
         self._hash = None
         self._image = None
@@ -23,10 +43,10 @@ class Block:
         self.data = data or {}
 
     def __str__(self):
-        return f"{self.id} {self.data} ({self.pos})"
+        return f"{self.id} {dict(self.data)}"
 
     def _get_hash(self):
-        return (self.__class__.__name__,) + tuple(sorted(self._data.items())) + (self.pos.x, self.pos.x)
+        return (self.__class__.__name__,) + tuple(sorted(self._data.items()))
 
     def __eq__(self, other):
         return isinstance(other, Block) and self._get_hash() == other._get_hash()
@@ -35,11 +55,16 @@ class Block:
         return not isinstance(other, Block) or self._get_hash() != other._get_hash()
 
     @property
-    def data(self) -> Dict[str, Any]:
-        return self._data
+    def key(self):
+        return (self.__class__,) + tuple(sorted(self._data.items()))
+
+    @property
+    def data(self) -> Mapping[str, Any]:
+        return MappingProxyType(self._data)
 
     @data.setter
     def data(self, value: Dict[str, Any]):
+        value = dict(value)
         self._data = {}
         for n in self.allowed_data:
             if n in value:
@@ -47,10 +72,28 @@ class Block:
                     raise ValueError(f"Field '{n}' of class '{self.__class__.__name__}' can not have value '{value[n]}'")
                 self._data[n] = value.pop(n)
             else:
-                self.data[n] = self.allowed_data[n][0]
+                self._data[n] = self.allowed_data[n][0]
         if len(value) > 0:
             raise ValueError(f"Fields '{tuple(value.keys())} ar not allowed for block '{self.__class__.__name__}''")
 
+    @property
+    def light_opacity(self) -> int:
+        """How many light levels are lost when light enters this block, on top of the one lost per step."""
+        return 15 if self.has_collision else 0
+
+    def scheduled_tick(self, world, pos):
+        """Called when a tick scheduled with `world.ticks.schedule` is due."""
+
+    def random_tick(self, world, pos):
+        """Called now and then for blocks with `random_ticks`."""
+
+    def neighbor_changed(self, world, pos):
+        """Called for blocks with `neighbor_updates` when they or a block next to them changed."""
+
+    @property
+    def images(self) -> Dict[str, pygame.Surface]:
+        return {n: block_atlas.get(p) for n, p in self.image_paths.items()}
+
     def _render(self):
         raise NotImplementedError
 
@@ -75,12 +118,29 @@ class Block:
 
     @property
     def rect(self) -> Rect:
+        """The shape of the block relative to the cell it is in."""
         if self._hash != self._get_hash():
             self._render()
             self._render_rect()
             self._hash = self._get_hash()
         return self._rect
 
+    def rect_at(self, pos) -> Rect:
+        r = self.rect
+        return Rect(pos[0] + r.x, pos[1] + r.y, r.w, r.h)
+
     @property
     def id(self):
         return self.__module__.replace("mods.", "") + ":" + self.__class__.__name__
+
+
+class Placeholder(Block):
+    """Fills columns that are not generated yet. Invisible, but solid so nothing falls into missing terrain."""
+
+    def _render(self):
+        self._image = pygame.Surface((SCALE, SCALE), pygame.SRCALPHA)
+        self._image.fill((0, 0, 0, 0))
+        self._draw_offset = 0, 0
+
+    def _render_rect(self):
+        self._rect = Rect(0, 0, 1, 1)
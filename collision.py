@@ -0,0 +1,66 @@
+from math import floor, ceil
+from typing import Callable, Tuple
+
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from util import Rect
+
+EPSILON = 1e-7
+
+
+class TileCollider:
+    """Swept AABB collision against the tile grid.
+
+    A box is moved along one axis at a time and only the cells its leading edge passes are checked,
+    so the cost depends on the distance travelled and nothing can tunnel through a block.
+    `solid_column(x)` returns a bool array with the `has_collision` value of every cell of column x.
+    World y points up, so `rect.y` is the lower and `rect.bottom` the upper edge of a box."""
+
+    def __init__(self, solid_column: Callable[[int], np.ndarray]):
+        self.solid_column = solid_column
+
+    def _blocked(self, x: int, y0: float, y1: float) -> bool:
+        r0, r1 = floor(y0 + EPSILON), ceil(y1 - EPSILON)
+        if r0 < 0:
+            return True
+        return bool(self.solid_column(x)[r0:min(r1, HEIGHT)].any())
+
+    def _solid_row(self, y: int, x0: float, x1: float) -> bool:
+        if y < 0:
+            return True
+        if y >= HEIGHT:
+            return False
+        return any(self.solid_column(x)[y] for x in range(floor(x0 + EPSILON), ceil(x1 - EPSILON)))
+
+    def move_x(self, rect: Rect, dx: float) -> bool:
+        if dx > 0:
+            for c in range(ceil(rect.right - EPSILON), ceil(rect.right + dx)):
+                if self._blocked(c, rect.y, rect.bottom):
+                    rect.right = c
+                    return True
+        elif dx < 0:
+            for c in range(floor(rect.x + EPSILON) - 1, floor(rect.x + dx) - 1, -1):
+                if self._blocked(c, rect.y, rect.bottom):
+                    rect.x = c + 1
+                    return True
+        rect.x += dx
+        return False
+
+    def move_y(self, rect: Rect, dy: float) -> bool:
+        if dy > 0:
+            for r in range(ceil(rect.bottom - EPSILON), ceil(rect.bottom + dy)):
+                if self._solid_row(r, rect.x, rect.right):
+                    rect.bottom = r
+                    return True
+        elif dy < 0:
+            for r in range(floor(rect.y + EPSILON) - 1, floor(rect.y + dy) - 1, -1):
+                if self._solid_row(r, rect.x, rect.right):
+                    rect.y = r + 1
+                    return True
+        rect.y += dy
+        return False
+
+    def move(self, rect: Rect, motion) -> Tuple[bool, bool]:
+        """Moves `rect` in place by `motion` as far as possible and returns whether it hit something on (x, y)."""
+        return self.move_x(rect, motion[0]), self.move_y(rect, motion[1])
@@ -1,33 +1,94 @@
-class Configuration:
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class ConfigurationMeta(type):
+    """Gives every key of `defaults` a slot, so reading a configuration value is a plain attribute read."""
+
+    def __new__(mcs, name, bases, namespace):
+        defaults = namespace.get("defaults", {})
+        inherited = set()
+        for base in bases:
+            for cls in base.__mro__:
+                inherited.update(getattr(cls, "__slots__", ()))
+        slots = tuple(namespace.get("__slots__", ()))
+        namespace["__slots__"] = slots + tuple(k for k in defaults if k not in inherited and k not in slots)
+        cls = super().__new__(mcs, name, bases, namespace)
+        keys = {}
+        for c in reversed(cls.__mro__):
+            keys.update(dict.fromkeys(c.__dict__.get("defaults", {})))
+        cls._keys = tuple(keys)
+        return cls
+
+
+class Configuration(metaclass=ConfigurationMeta):
+    """Values for the keys of `defaults`, only changeable if `editable`.
+
+    Every change increases `version`. `fingerprint` is a hash of the content that stays the same between runs
+    and processes, so it can be used to key caches of anything computed from the configuration."""
+    __slots__ = ("_editable", "_version", "_fingerprints")
     defaults = {}
     editable = False
+    _keys: Tuple[str, ...] = ()
 
     def __init__(self, config: dict, editable=None, **kwargs):
-        self.__d = self.defaults.copy()
-        self.__d.update(config)
-        self.__d.update(kwargs)
-        self.__editable = self.editable if editable is None else editable
+        object.__setattr__(self, "_editable", self.editable if editable is None else editable)
+        object.__setattr__(self, "_version", 0)
+        object.__setattr__(self, "_fingerprints", {})
+        d = {}
+        for c in reversed(self.__class__.__mro__):
+            d.update(c.__dict__.get("defaults", {}))
+        d.update(config)
+        d.update(kwargs)
+        for k, v in d.items():
+            if k not in self._keys:
+                raise KeyError(f"'{k}' is not a key of this configuration ('{self.__class__.__name__}')")
+            object.__setattr__(self, k, v)
 
-    def __getitem__(self, item):
-        return self.__d[item]
+    def __reduce__(self):
+        return self.__class__, (self.as_dict(), self._editable)
 
-    def __getattr__(self, item):
-        return self.__d[item]
+    @property
+    def version(self) -> int:
+        return self._version
 
-    def __getattribute__(self, item):
-        print(item)
-        return super().__getattribute__(item)
+    def keys(self) -> Tuple[str, ...]:
+        return self._keys
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self._keys}
+
+    def fingerprint(self, keys: Optional[Iterable[str]] = None) -> str:
+        """sha1 of the values of `keys` (all keys by default)."""
+        keys = tuple(sorted(self._keys if keys is None else keys))
+        fp = self._fingerprints.get(keys)
+        if fp is None:
+            data = json.dumps([[k, getattr(self, k)] for k in keys], default=repr)
+            fp = self._fingerprints[keys] = hashlib.sha1(data.encode()).hexdigest()
+        return fp
+
+    def __getitem__(self, item):
+        if item not in self._keys:
+            raise KeyError(item)
+        return getattr(self, item)
 
     def __setitem__(self, key, value):
-        if not self.__editable:
-            raise TypeError(f"this configuration ('{self.__class__.__name__}') cant be edit.")
-        self.__d[key] = value
+        if key not in self._keys:
+            raise KeyError(key)
+        setattr(self, key, value)
 
     def __setattr__(self, key, value):
-        if not self.__editable:
+        if not self._editable:
             raise TypeError(f"this configuration ('{self.__class__.__name__}') cant be edit.")
-        print(key)
-        self.d[key] = value
+        if key not in self._keys:
+            raise AttributeError(f"'{key}' is not a key of this configuration ('{self.__class__.__name__}')")
+        object.__setattr__(self, key, value)
+        object.__setattr__(self, "_version", self._version + 1)
+        self._fingerprints.clear()
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.as_dict()})"
 
 
 def get_config_class(name, defaults_, editable_, module_="DynamicConfiguration", qualname_=None):
@@ -1,15 +1,96 @@
+from typing import Dict, List, Tuple, Any
+
 import pygame
 
 
+class Input:
+    """Keyboard and mouse state read by the controllers, the live pygame state."""
+
+    def is_pressed(self, key: int) -> bool:
+        return pygame.key.get_pressed()[key]
+
+    def mouse_pos(self) -> Tuple[int, int]:
+        return pygame.mouse.get_pos()
+
+    def advance(self, tick: int) -> List[pygame.event.EventType]:
+        """The events of `tick`, the live input has none, its events come from the event loop."""
+        return []
+
+
+class ScriptedInput(Input):
+    """Input replayed from a list of actions, each a dict with the `tick` it happens at and one of
+
+    * `"press": key` / `"release": key`, changes the pressed keys and sends a KEYDOWN / KEYUP event
+    * `"keydown": key` / `"keyup": key`, only sends the event, `"count"` times (default 1)
+    * `"pressed": [keys]`, only sets the pressed keys
+    * `"mouse": [x, y]`, moves the mouse
+
+    Keys are pygame key names like `"K_LEFT"` or key codes."""
+
+    def __init__(self, actions: List[Dict[str, Any]]):
+        self.actions = sorted(actions, key=lambda a: a["tick"])
+        self._next = 0
+        self._pressed = set()
+        self._mouse = (0, 0)
+
+    @staticmethod
+    def key(key) -> int:
+        return getattr(pygame, key) if isinstance(key, str) else key
+
+    @property
+    def done(self) -> bool:
+        return self._next >= len(self.actions)
+
+    def advance(self, tick: int) -> List[pygame.event.EventType]:
+        """Applies the actions up to `tick` and returns their events."""
+        events = []
+        while not self.done and self.actions[self._next]["tick"] <= tick:
+            action = self.actions[self._next]
+            self._next += 1
+            if "press" in action:
+                key = self.key(action["press"])
+                self._pressed.add(key)
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+            if "release" in action:
+                key = self.key(action["release"])
+                self._pressed.discard(key)
+                events.append(pygame.event.Event(pygame.KEYUP, key=key, mod=0, unicode="", scancode=0))
+            for kind, event_type in (("keydown", pygame.KEYDOWN), ("keyup", pygame.KEYUP)):
+                if kind in action:
+                    event = pygame.event.Event(event_type, key=self.key(action[kind]), mod=0, unicode="", scancode=0)
+                    events += [event] * action.get("count", 1)
+            if "pressed" in action:
+                self._pressed = {self.key(k) for k in action["pressed"]}
+            if "mouse" in action:
+                self._mouse = tuple(action["mouse"])
+        return events
+
+    def is_pressed(self, key: int) -> bool:
+        return key in self._pressed
+
+    def mouse_pos(self) -> Tuple[int, int]:
+        return self._mouse
+
+
 class ControlHandler:
     repeat_args = ()
 
     def __init__(self, scene):
-        pygame.key.set_repeat(*self.repeat_args)
+        if pygame.display.get_init():
+            pygame.key.set_repeat(*self.repeat_args)
         self.scene = scene
 
+    @property
+    def input(self) -> Input:
+        return self.scene.input
+
     def handle(self, event: pygame.event.EventType):
         pass
 
     def update(self, dt):
+        """Called once per simulation tick with the fixed tick length."""
+        pass
+
+    def frame(self, alpha):
+        """Called once per drawn frame, `alpha` is the interpolation factor between the last two ticks."""
         pass
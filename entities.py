@@ -0,0 +1,107 @@
+from typing import List, Optional
+
+import numpy as np
+
+from util import Rect
+
+
+class EntityStore:
+    """Physical state of objects in contiguous arrays, one row (slot) per object.
+
+    `pos` is the lower left corner of the object's box (`Rect.x`, `Rect.y`), `previous` the position before the
+    last tick, `shape` the `has_shape` of the object. Objects are handles to a slot, see `Object`."""
+
+    def __init__(self, capacity: int = 64):
+        self.pos = np.zeros((capacity, 2))
+        self.previous = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.size = np.zeros((capacity, 2))
+        self.on_ground = np.zeros(capacity, bool)
+        self.on_wall = np.zeros(capacity, bool)
+        self.shape = np.zeros(capacity, bool)
+        self.used = np.zeros(capacity, bool)
+        self.objects: List[Optional[object]] = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.objects) - len(self._free)
+
+    def _grow(self):
+        old = len(self.objects)
+        for name in ("pos", "previous", "velocity", "size", "on_ground", "on_wall", "shape", "used"):
+            a = getattr(self, name)
+            new = np.zeros((old * 2,) + a.shape[1:], a.dtype)
+            new[:old] = a
+            setattr(self, name, new)
+        self.objects += [None] * old
+        self._free = list(range(old * 2 - 1, old - 1, -1)) + self._free
+
+    def allocate(self, obj) -> int:
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self.objects[slot] = obj
+        self.used[slot] = True
+        self.pos[slot] = self.previous[slot] = self.velocity[slot] = self.size[slot] = 0
+        self.on_ground[slot] = self.on_wall[slot] = False
+        self.shape[slot] = getattr(obj, "has_shape", False)
+        return slot
+
+    def release(self, slot: int):
+        self.objects[slot] = None
+        self.used[slot] = False
+        self._free.append(slot)
+
+    def transfer(self, slot: int, other: "EntityStore") -> int:
+        """Moves the row of `slot` into `other` and returns its slot there."""
+        new = other.allocate(self.objects[slot])
+        other.pos[new] = self.pos[slot]
+        other.previous[new] = self.previous[slot]
+        other.velocity[new] = self.velocity[slot]
+        other.size[new] = self.size[slot]
+        other.on_ground[new] = self.on_ground[slot]
+        other.on_wall[new] = self.on_wall[slot]
+        self.release(slot)
+        return new
+
+    def slots(self) -> np.ndarray:
+        return np.nonzero(self.used)[0]
+
+
+class SlotRect(Rect):
+    """A `Rect` reading and writing the box of an object in its entity store."""
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    @property
+    def x(self):
+        return float(self._obj._store.pos[self._obj._slot, 0])
+
+    @x.setter
+    def x(self, value):
+        self._obj._store.pos[self._obj._slot, 0] = value
+
+    @property
+    def y(self):
+        return float(self._obj._store.pos[self._obj._slot, 1])
+
+    @y.setter
+    def y(self, value):
+        self._obj._store.pos[self._obj._slot, 1] = value
+
+    @property
+    def w(self):
+        return float(self._obj._store.size[self._obj._slot, 0])
+
+    @w.setter
+    def w(self, value):
+        self._obj._store.size[self._obj._slot, 0] = value
+
+    @property
+    def h(self):
+        return float(self._obj._store.size[self._obj._slot, 1])
+
+    @h.setter
+    def h(self, value):
+        self._obj._store.size[self._obj._slot, 1] = value
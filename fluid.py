@@ -0,0 +1,210 @@
+from typing import Dict, List, Type, Tuple
+
+import numpy as np
+import pygame
+
+from CONFIGURATION import HEIGHT
+from block import Block
+from textures import block_atlas
+from util import Rect
+
+# cells around active ones that take part in a step, fluid moves at most one cell per step
+MARGIN = 2
+
+
+class FluidBlock(Block):
+    """A cell filled with a fluid up to `level` of `max_level`, moved by `FluidSimulation` every `flow_interval`
+    ticks. Where it flows away `empty` is left. `contact` is {other fluid: (block for full cells, block for the
+    others)}, the cells of this fluid touching the other fluid turn into those blocks."""
+    # without collision light goes through it unchanged, so flowing doesn't need light updates
+    has_collision = False
+    max_level = 8
+    flow_interval = 6
+    empty: Type[Block] = None
+    contact: Dict[Type["FluidBlock"], Tuple[Type[Block], Type[Block]]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.allowed_data = {"level": tuple(range(cls.max_level, 0, -1))}
+
+    def _render(self):
+        # the first frame of the animated texture, filled up to the level
+        texture = block_atlas.get(self.image_paths["still"])
+        w = texture.get_width()
+        h = round(w * self.data["level"] / self.max_level)
+        self._image = pygame.Surface((w, w), pygame.SRCALPHA)
+        self._image.fill((0, 0, 0, 0))
+        self._image.blit(texture, (0, w - h), (0, w - h, w, h))
+        self._draw_offset = 0, 0
+
+    def _render_rect(self):
+        self._rect = Rect(0, 0, 1, self.data["level"] / self.max_level)
+
+
+class FluidSimulation:
+    """Flow of the fluid blocks of a world, as a cellular automaton over arrays of fluid levels.
+
+    Only cells near block changes are active, a step of a fluid takes the bounding boxes of its active cells (plus
+    `MARGIN`) out of the columns, computes the flow of all cells at once and writes the changed cells back with
+    `World.set_states`. Those changes make their surroundings active for the next step, fluid that didn't move
+    isn't looked at again, so settled lakes cost nothing.
+
+    A step moves fluid into the cell below where it has room and then evens out the levels of horizontal neighbours,
+    to the right and to the left, alternating which side goes first. Each cell only gives to one neighbour per
+    pass and only as much as the neighbour had room for before the pass, so no fluid is lost or created."""
+
+    def __init__(self, world):
+        self.world = world
+        self.tick = 0
+        self.cells_changed = 0
+        self._size = 0
+        self._kinds: List[Type[FluidBlock]] = []
+        self._states: Dict[Type[FluidBlock], np.ndarray] = {}
+        self._kind = self._level = self._open = None
+        self._active: Dict[Type[FluidBlock], Dict[int, List[int]]] = {}
+        world.subscribe(self._changed)
+
+    def _tables(self):
+        p = self.world.palette
+        if self._size == len(p):
+            return
+        kinds = []
+        for s in list(p):
+            if isinstance(s, FluidBlock) and type(s) not in kinds:
+                kinds.append(type(s))
+        # indexing all states first, the palette can't grow after the tables are made
+        self._states = {k: np.array([p.index(k.empty)] + [p.index(k, {"level": i}) for i in range(1, k.max_level + 1)])
+                        for k in kinds}
+        for k in kinds:
+            for full, partial in k.contact.values():
+                p.index(full), p.index(partial)
+        kind = np.full(len(p), -1, np.int8)
+        level = np.zeros(len(p), np.int16)
+        for i, s in enumerate(p):
+            if isinstance(s, FluidBlock):
+                kind[i] = kinds.index(type(s))
+                level[i] = s.data["level"]
+        self._kind, self._level = kind, level
+        self._open = ~p.table("has_collision", bool) & (kind < 0)
+        self._kinds = kinds
+        for k in kinds:
+            self._active.setdefault(k, {})
+        self._size = len(p)
+
+    def active(self) -> int:
+        """Number of active columns."""
+        return len({x for a in self._active.values() for x in a})
+
+    def _activate(self, x: int, y0: int, y1: int):
+        for active in self._active.values():
+            span = active.get(x)
+            if span is None:
+                active[x] = [y0, y1]
+            else:
+                span[0], span[1] = min(span[0], y0), max(span[1], y1)
+
+    def _changed(self, changes):
+        self._tables()
+        for c in changes:
+            x, y = c.pos
+            for nx in (x - 1, x, x + 1):
+                self._activate(nx, y - 1, y + 1)
+
+    def add_column(self, x: int, column: np.ndarray):
+        """Activates fluid of a new column that could flow, also into or out of its neighbours."""
+        self._tables()
+        if not self._kinds:
+            return
+        blocks = self.world._blocks
+        kind, level, space = self._kind[column], self._level[column], self._open[column]
+        moving = np.zeros(HEIGHT, bool)
+        for k, cls in enumerate(self._kinds):
+            own = kind == k
+            moving |= own & (level < cls.max_level)
+            moving[1:] |= own[1:] & (space[:-1] | own[:-1] & (level[:-1] < cls.max_level))
+        for nx in (x - 1, x + 1):
+            if nx in blocks:
+                # fluid flowing between the columns or touching another fluid, the step around x covers nx too
+                near = self._kind[blocks[nx]]
+                moving |= (kind >= 0) & self._open[blocks[nx]]
+                moving |= (near >= 0) & (space | (kind >= 0) & (kind != near))
+        ys = np.flatnonzero(moving)
+        if len(ys):
+            self._activate(x, int(ys[0]), int(ys[-1]))
+
+    def remove_column(self, x: int):
+        for active in self._active.values():
+            active.pop(x, None)
+
+    def _regions(self, active: Dict[int, List[int]]):
+        """Bounding boxes (xs, y0, y1) around runs of active columns, split where columns aren't loaded."""
+        blocks = self.world._blocks
+        xs = sorted({nx for x in active for nx in range(x - MARGIN, x + MARGIN + 1) if nx in blocks})
+        run = []
+        for x in xs + [None]:
+            if run and (x is None or x != run[-1] + 1):
+                spans = [active[i] for i in run if i in active]
+                if spans:
+                    y0 = max(min(s[0] for s in spans) - MARGIN, 0)
+                    y1 = min(max(s[1] for s in spans) + MARGIN + 1, HEIGHT)
+                    yield run, y0, y1
+                run = []
+            if x is not None:
+                run.append(x)
+
+    def update(self):
+        self.tick += 1
+        if not self._kinds:
+            return
+        self._tables()
+        with self.world.edit():
+            for k, cls in enumerate(self._kinds):
+                if self.tick % cls.flow_interval or not self._active[cls]:
+                    continue
+                active, self._active[cls] = self._active[cls], {}
+                for xs, y0, y1 in self._regions(active):
+                    self._step(k, cls, xs, y0, y1)
+
+    def _step(self, k: int, cls: Type[FluidBlock], xs: List[int], y0: int, y1: int):
+        blocks = self.world._blocks
+        grid = np.stack([blocks[x][y0:y1] for x in xs])
+        kind = self._kind[grid]
+        own = kind == k
+        if not own.any():
+            return
+        old = np.where(own, self._level[grid], 0)
+        level = old.copy()
+        room = np.where(own | self._open[grid], cls.max_level, 0)
+
+        # down, as much as fits into the cell below
+        flow = np.minimum(level[:, 1:], room[:, :-1] - level[:, :-1])
+        level[:, 1:] -= flow
+        level[:, :-1] += flow
+        # sideways, half of the difference, small steps stay
+        for right in ((True, False) if self.tick // cls.flow_interval % 2 else (False, True)):
+            a, b = (slice(None, -1), slice(1, None)) if right else (slice(1, None), slice(None, -1))
+            flow = np.where(room[b] > 0, (level[a] - level[b]) // 2, 0).clip(0)
+            flow = np.minimum(flow, room[b] - level[b])
+            level[a] -= flow
+            level[b] += flow
+
+        states = self._states[cls][level]
+        changed = level != old
+        for other, (full, partial) in cls.contact.items():
+            if other not in self._kinds:
+                continue
+            touching = np.zeros_like(own)
+            near = kind == self._kinds.index(other)
+            touching[1:] |= near[:-1]
+            touching[:-1] |= near[1:]
+            touching[:, 1:] |= near[:, :-1]
+            touching[:, :-1] |= near[:, 1:]
+            touching &= level > 0
+            p = self.world.palette
+            states = np.where(touching, np.where(level == cls.max_level, p.index(full), p.index(partial)), states)
+            changed |= touching
+
+        ix, iy = np.nonzero(changed)
+        if len(ix):
+            self.cells_changed += len(ix)
+            self.world.set_states([xs[i] for i in ix.tolist()], (iy + y0).tolist(), states[ix, iy].tolist())
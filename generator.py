@@ -1,21 +1,221 @@
-from typing import List, Dict, Optional
+from typing import Dict, Optional, Type, Union, Tuple, Any, List, Iterable
 
-from block import Block
+import numpy as np
+
+from CONFIGURATION import HEIGHT
 from config import Configuration
+from palette import Palette
+from profiler import profiler
+from region import encode_column
+from util import LimitedSizeDict
+
+
+def column_random(seed: int, xs: Iterable[int], n: int = 1) -> np.ndarray:
+    """`n` uniform floats in [0, 1) for every x, shape (len(xs), n). They only depend on the seed, x and their
+    index, so they are the same no matter in which order or process columns are generated."""
+    xs = np.asarray(xs, np.int64).astype(np.uint64)
+    z = xs[:, None] * np.uint64(n) + np.arange(n, dtype=np.uint64)
+    z += np.uint64(seed * 0x9E3779B97F4A7C15 % 2 ** 64)
+    # splitmix64
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)) * 2.0 ** -53
+
+
+def _runs(xs: List[int]) -> List[Tuple[int, int]]:
+    """Sorted ints as (start, stop) ranges of consecutive values."""
+    runs = []
+    for x in xs:
+        if runs and runs[-1][1] == x:
+            runs[-1][1] = x + 1
+        else:
+            runs.append([x, x + 1])
+    return [(a, b) for a, b in runs]
 
 
 class Generator:
-    def __init__(self, configuration: Optional[Configuration] = None):
+    """Produces column arrays in two stages.
+
+    The terrain stage: subclasses override `_generate` for single columns or, better, `_generate_range` to
+    produce many columns in one vectorized call, the columns go into `_terrain`.
+    The decoration stage: `_decorate_range` plans the structures (trees, houses, ...) starting in columns whose
+    terrain is done and adds their blocks with `place`. They can reach `structure_radius` columns to both sides,
+    blocks for columns without terrain yet wait as pending placements. A column is done when the structures of all
+    columns in reach are planned, every column goes through each stage once. Terrain, planned origins and pending
+    placements are only kept next to generated columns, `discard` forgets them with the column.
+
+    Generated columns are cached under the `fingerprint` of the `dependencies` (configuration keys, all by
+    default), so changing other keys keeps the cache and changing back to earlier values finds the old columns."""
+    configuration_class: Type[Configuration] = Configuration
+    dependencies: Optional[Tuple[str, ...]] = None
+    batch_size = 1024
+    cache_versions = 2
+    structure_radius = 0
+
+    def __init__(self, configuration: Union[Configuration, dict, None] = None, palette: Optional[Palette] = None):
+        if not isinstance(configuration, Configuration):
+            configuration = self.configuration_class(configuration or {})
         self.configuration: Configuration = configuration
-        self._generated: Dict[int, List[Block]] = {}
-        self.__hash = hash(configuration)
+        self.palette: Palette = palette if palette is not None else Palette()
+        self._caches = LimitedSizeDict(size_limit=self.cache_versions)
+        self._stages: Dict[str, LimitedSizeDict] = {}
+        self._version = None
+        self._fingerprint = None
+        self._generated: Dict[int, np.ndarray] = {}
+        self._terrain: Dict[int, np.ndarray] = {}
+        self._decorated = set()
+        self._placements: Dict[int, List[tuple]] = {}
+        self._check_configuration()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_caches"] = LimitedSizeDict(size_limit=self.cache_versions)
+        state["_stages"] = {}
+        state["_version"] = None
+        state["_generated"] = {}
+        state["_terrain"] = {}
+        state["_decorated"] = set()
+        state["_placements"] = {}
+        return state
+
+    @property
+    def fingerprint(self) -> str:
+        """Fingerprint of the configuration values the generated columns depend on."""
+        self._check_configuration()
+        return self._fingerprint
 
     def _generate(self, x: int):
-        raise NotImplementedError
+        """Puts the terrain of column `x` into `_terrain`, not needed if `_generate_range` is overridden."""
+        raise NotImplementedError(f"{type(self).__name__} has to override _generate or _generate_range")
+
+    def _generate_range(self, x0: int, x1: int):
+        for x in range(x0, x1):
+            if x not in self._terrain:
+                self._generate(x)
+
+    def _decorate_range(self, x0: int, x1: int):
+        pass
+
+    def place(self, origin: int, x: int, y: int, blocks: np.ndarray, replace: Optional[Tuple[int, ...]] = None):
+        """Sets the blocks of column `x` from height `y` upwards for the structure starting in column `origin`.
+        Negative values are skipped, with `replace` only blocks that are in it are replaced."""
+        if abs(x - origin) > self.structure_radius:
+            raise ValueError(f"column {x} is out of the structure radius of column {origin}")
+        if x in self._generated:
+            # planned again after a neighbour was discarded, this column has the structure already
+            return
+        self._placements.setdefault(x, []).append((origin, y, blocks, replace))
 
-    def __call__(self, x: int) -> List[Block]:
-        if hash(self.configuration) != self.__hash:
-            self._generated = {}
+    def _check_configuration(self):
+        if self.configuration.version != self._version:
+            self._version = self.configuration.version
+            self._fingerprint = self.configuration.fingerprint(self.dependencies)
+            if self._fingerprint not in self._caches:
+                self._caches[self._fingerprint] = {}, {}, set(), {}
+            self._generated, self._terrain, self._decorated, self._placements = self._caches[self._fingerprint]
+
+    def _stage(self, name: str, keys: Tuple[str, ...]) -> Dict[int, Any]:
+        """A cache for intermediate results of columns that only depend on the configuration keys `keys`."""
+        fp = self.configuration.fingerprint(keys)
+        caches = self._stages.get(name)
+        if caches is None:
+            caches = self._stages[name] = LimitedSizeDict(size_limit=self.cache_versions)
+        if fp not in caches:
+            caches[fp] = {}
+        return caches[fp]
+
+    def _undecorate(self, origins: Iterable[int]):
+        """Forgets that the structures of `origins` were planned and takes their blocks out of the pending
+        placements, planning them again doesn't add them twice."""
+        origins = {o for o in origins if o in self._decorated}
+        if not origins:
+            return
+        self._decorated.difference_update(origins)
+        r = self.structure_radius
+        for x in range(min(origins) - r, max(origins) + r + 1):
+            placements = self._placements.get(x)
+            if placements:
+                placements[:] = [p for p in placements if p[0] not in origins]
+                if not placements:
+                    del self._placements[x]
+
+    def _near_generated(self, x: int) -> bool:
+        r = self.structure_radius
+        return any(x + d in self._generated for d in range(-r, r + 1))
+
+    def discard(self, x: int):
+        """Forgets column `x`, generating it again gives the same column. What was kept for the columns next to
+        it is forgotten as well, unless they are next to another generated column."""
+        r = self.structure_radius
+        self._generated.pop(x, None)
+        # their blocks for x are gone with the column, they are planned again with it
+        self._undecorate(range(x - r, x + r + 1))
+        for y in range(x - r, x + r + 1):
+            if y in self._terrain and not self._near_generated(y):
+                del self._terrain[y]
+        for caches in self._stages.values():
+            for cache in caches.values():
+                cache.pop(x, None)
+
+    def _finish(self, x0: int, x1: int):
+        r = self.structure_radius
+        xs = [x for x in range(x0, x1) if x not in self._generated]
+        if not xs:
+            return
+        origins = [x for x in range(xs[0] - r, xs[-1] + r + 1) if x not in self._decorated]
+        terrain = sorted({x for x in origins + xs if x not in self._terrain})
+        for a, b in _runs(terrain):
+            self._generate_range(a, b)
+        for a, b in _runs(origins):
+            self._decorate_range(a, b)
+        self._decorated.update(origins)
+        for x in xs:
+            column = self._terrain.pop(x)
+            # in the order of the origins, so overlapping structures don't depend on the generation order
+            for origin, y, blocks, replace in sorted(self._placements.pop(x, ()), key=lambda p: p[0]):
+                lo, hi = max(y, 0), min(y + len(blocks), HEIGHT)
+                if lo >= hi:
+                    continue
+                part, blocks = column[lo:hi], blocks[lo - y:hi - y]
+                mask = blocks >= 0
+                if replace is not None:
+                    mask &= np.logical_or.reduce([part == r for r in replace])
+                part[mask] = blocks[mask]
+            self._generated[x] = column
+        # origins with all columns in reach done have no pending blocks left
+        self._decorated.difference_update([o for o in range(xs[0] - r, xs[-1] + r + 1) if o in self._decorated
+                                           and all(o + d in self._generated for d in range(-r, r + 1))])
+
+    def generate_range(self, x0: int, x1: int) -> Dict[int, np.ndarray]:
+        """All columns with x0 <= x < x1."""
+        self._check_configuration()
+        missing = [x for x in range(x0, x1) if x not in self._generated]
+        if missing:
+            with profiler.span("generator.range"):
+                for b in range(missing[0], missing[-1] + 1, self.batch_size):
+                    self._finish(b, min(b + self.batch_size, missing[-1] + 1))
+        return {x: self._generated[x] for x in range(x0, x1)}
+
+    def __call__(self, x: int) -> np.ndarray:
+        self._check_configuration()
         if x not in self._generated:
-            self._generate(x)
+            with profiler.span("generator.column"):
+                self._finish(x, x + 1)
         return self._generated[x]
+
+
+_worker_generator: Generator = None
+
+
+def _init_worker(generator: Generator):
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _generate_encoded(x0: int, x1: int) -> Dict[int, bytes]:
+    """Runs in a worker process of `World`. Columns are sent back encoded, since the palettes of the processes differ."""
+    columns = {x: encode_column(_worker_generator.palette, c) for x, c in _worker_generator.generate_range(x0, x1).items()}
+    for x in columns:
+        _worker_generator.discard(x)
+    return columns
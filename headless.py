@@ -0,0 +1,151 @@
+import argparse
+import json
+import sys
+import time
+from typing import Dict, Any, List, Tuple
+
+from control_handler import Input, ScriptedInput
+from profiler import profiler
+from recording import Recording, checksum
+from world_scene import PlayScene
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class HeadlessScene(PlayScene):
+    """A `PlayScene` that is stepped tick by tick instead of being run by an application, nothing is drawn."""
+
+    def __init__(self, modpack: Dict[str, Any], input: Input = None, resolution=(640, 480)):
+        super().__init__(resolution=resolution)
+        self.input = input if input is not None else ScriptedInput([])
+        self.tick = 0
+        self.load(modpack, {})
+
+    def step(self):
+        """Runs one simulation tick, with the input events of this tick."""
+        for event in self.input.advance(self.tick):
+            self.handle_event(event)
+        self._tick(self.world.tick_length)
+        self.world.update(self.world.tick_length)
+        self.tick += 1
+        self._ticked()
+
+    def close(self):
+        if self.recorder is not None:
+            self.recorder.save(self.modpack["record"])
+        self.world.close()
+
+
+def memory() -> float:
+    """Peak resident memory of the process in MiB, 0 where the resource module is missing."""
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10
+
+
+def run(modpack: Dict[str, Any], ticks: int, input: Input = None, realtime: bool = False,
+        resolution: Tuple[int, int] = (640, 480), checksums: List[List[int]] = ()) -> Dict[str, Any]:
+    """Loads the world around the player, runs `ticks` ticks and returns timing and memory numbers.
+
+    `checksums` are [tick, checksum] of a recording, the first tick the world differs at is reported."""
+    t = time.perf_counter()
+    scene = HeadlessScene(modpack, input, resolution)
+    world = scene.world
+    world.preload()
+    load = time.perf_counter() - t
+    expected = dict(map(tuple, checksums))
+    diverged = None
+    t = time.perf_counter()
+    try:
+        for i in range(ticks):
+            scene.step()
+            if diverged is None and scene.tick in expected and checksum(world) != expected[scene.tick]:
+                diverged = scene.tick
+            if realtime:
+                time.sleep(max(0.0, t + (i + 1) * world.tick_length - time.perf_counter()))
+    finally:
+        elapsed = time.perf_counter() - t
+        scene.close()
+    return {
+        "ticks": ticks,
+        "seconds": elapsed,
+        "ticks_per_second": ticks / elapsed if elapsed else float("inf"),
+        "load_seconds": load,
+        "generated_columns": world.generated,
+        "generation_seconds": world.generation_time,
+        "loaded_columns": len(world._blocks),
+        "objects": len(world.entities),
+        "player": list(scene.player.pos),
+        "peak_memory_mib": memory(),
+        **({"checksums": len(expected), "diverged_at": diverged} if expected else {}),
+    }
+
+
+def replay(path: str, realtime: bool = False) -> Dict[str, Any]:
+    """Runs a recording as fast as possible (see recording.py), `diverged_at` in the report is the first tick with
+    a different world than when it was recorded, None if there is none."""
+    recording = Recording.load(path)
+    return run(recording.modpack, recording.ticks, ScriptedInput(recording.actions), realtime,
+               recording.resolution, recording.checksums)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the simulation without a window and reports its speed.")
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--modpack", help="json file with a modpack, defaults to the one in main.py")
+    parser.add_argument("--script", help="json file with a list of scripted input actions, see ScriptedInput")
+    parser.add_argument("--record", help="record the input into this file, for --replay")
+    parser.add_argument("--replay", help="run a recording instead, all other options but the outputs are ignored")
+    parser.add_argument("--save", help="save directory, overrides the modpack")
+    parser.add_argument("--no-save", action="store_true", help="don't load or save the world")
+    parser.add_argument("--workers", type=int, help="generator processes, overrides the modpack")
+    parser.add_argument("--realtime", action="store_true", help="run at the tick rate instead of as fast as possible")
+    parser.add_argument("--json", action="store_true", help="print the report as json")
+    parser.add_argument("--profile", help="write the span percentiles as json to this file")
+    parser.add_argument("--trace", help="write all spans as a chrome trace to this file")
+    args = parser.parse_args(argv)
+
+    if args.modpack:
+        with open(args.modpack) as f:
+            modpack = json.load(f)
+    else:
+        from main import mod_pack
+        modpack = dict(mod_pack)
+    if args.save:
+        modpack["save"] = args.save
+    if args.no_save:
+        modpack["save"] = None
+    if args.workers is not None:
+        modpack["workers"] = args.workers
+    if args.record:
+        modpack["record"] = args.record
+    actions = []
+    if args.script:
+        with open(args.script) as f:
+            actions = json.load(f)
+
+    profiler.enabled = bool(args.profile or args.trace)
+    profiler.trace = bool(args.trace)
+    if args.replay:
+        report = replay(args.replay, args.realtime)
+    else:
+        report = run(modpack, args.ticks, ScriptedInput(actions), args.realtime)
+    if args.profile:
+        profiler.export_json(args.profile)
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for k, v in report.items():
+            print(f"{k:>20}: {v:.3f}" if isinstance(v, float) else f"{k:>20}: {v}")
+    if report.get("diverged_at") is not None:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+from collections import deque
+from typing import Dict, List, Set, Tuple, Iterable
+
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from palette import Palette
+
+MAX_LIGHT = 15
+
+pos = Tuple[int, int]
+
+
+class LightEngine:
+    """Sky and block light levels of loaded columns.
+
+    Light spreads with breadth first searches, losing one level per step plus the `light_opacity` of the block it
+    enters. Sky light at full strength goes straight down without loss. A block change only re-propagates the
+    light around it: light that came from the old block is removed first, then the surroundings fill the gap again.
+    Cells whose light changed are collected in `changed`."""
+
+    def __init__(self, palette: Palette):
+        self.palette = palette
+        self._columns: Dict[int, np.ndarray] = {}
+        self.sky: Dict[int, bytearray] = {}
+        self.block: Dict[int, bytearray] = {}
+        self.changed: Set[pos] = set()
+
+    def level(self, x: int, y: int) -> int:
+        if x not in self._columns or not 0 <= y < HEIGHT:
+            return MAX_LIGHT
+        return max(self.sky[x][y], self.block[x][y])
+
+    def add_column(self, x: int, column: np.ndarray):
+        opacity = self.palette.table("light_opacity", np.uint8)[column]
+        emission = self.palette.table("light_emission", np.uint8)[column]
+        opaque = np.nonzero(opacity)[0]
+        sky = np.zeros(HEIGHT, np.uint8)
+        sky[opaque[-1] + 1 if len(opaque) else 0:] = MAX_LIGHT
+        self._columns[x] = column
+        self.sky[x] = bytearray(sky.tobytes())
+        self.block[x] = bytearray(emission.tobytes())
+        for channel, is_sky in ((self.sky, True), (self.block, False)):
+            self._propagate(channel, is_sky, self._seeds(channel, x))
+
+    def remove_column(self, x: int):
+        """Forgets the column, the light that came from it is removed from the neighbours."""
+        if x not in self._columns:
+            return
+        del self._columns[x]
+        for channel, is_sky in ((self.sky, True), (self.block, False)):
+            a = channel.pop(x)
+            start = [(x, y, level) for y, level in enumerate(a) if level > 1]
+            self._propagate(channel, is_sky, self._remove(channel, is_sky, start))
+
+    def _seeds(self, channel: Dict[int, bytearray], x: int) -> List[pos]:
+        """Cells of a new column and its neighbours that could light a neighbouring cell."""
+        a = np.frombuffer(channel[x], np.uint8).astype(int)
+        seeds = [(x, int(y) + 1) for y in np.nonzero(a[1:] > a[:-1] + 1)[0]]
+        seeds += [(x, int(y)) for y in np.nonzero(a[:-1] > a[1:] + 1)[0]]
+        for nx in (x - 1, x + 1):
+            if nx in channel:
+                b = np.frombuffer(channel[nx], np.uint8).astype(int)
+                seeds += [(x, int(y)) for y in np.nonzero(a > b + 1)[0]]
+                seeds += [(nx, int(y)) for y in np.nonzero(b > a + 1)[0]]
+        return seeds
+
+    def _propagate(self, channel: Dict[int, bytearray], is_sky: bool, queue: Iterable[pos]):
+        opacity = bytes(self.palette.table("light_opacity", np.uint8))
+        columns = self._columns
+        changed = self.changed
+        queue = deque(queue)
+        while queue:
+            x, y = queue.popleft()
+            level = channel[x][y]
+            if level <= 1:
+                continue
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                a = channel.get(nx)
+                if a is None or not 0 <= ny < HEIGHT:
+                    continue
+                op = opacity[columns[nx][ny]]
+                if is_sky and ny == y - 1 and level == MAX_LIGHT and op == 0:
+                    new = MAX_LIGHT
+                else:
+                    new = level - 1 - op
+                if new > a[ny]:
+                    a[ny] = new
+                    changed.add((nx, ny))
+                    queue.append((nx, ny))
+
+    def _remove(self, channel: Dict[int, bytearray], is_sky: bool, start: List[Tuple[int, int, int]]) -> List[pos]:
+        """Darkens everything that got its light from the start cells, returns the cells that can light it again."""
+        relight = []
+        changed = self.changed
+        queue = deque(start)
+        while queue:
+            x, y, level = queue.popleft()
+            for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+                a = channel.get(nx)
+                if a is None or not 0 <= ny < HEIGHT or a[ny] == 0:
+                    continue
+                n = a[ny]
+                if n < level or (is_sky and ny == y - 1 and level == n == MAX_LIGHT):
+                    a[ny] = 0
+                    changed.add((nx, ny))
+                    queue.append((nx, ny, n))
+                else:
+                    relight.append((nx, ny))
+        return relight
+
+    def update_block(self, x: int, y: int):
+        """Call after the block at (x, y) was changed in its column."""
+        if x not in self._columns:
+            return
+        state = self._columns[x][y]
+        opacity = self.palette.table("light_opacity", np.uint8)[state]
+        emission = self.palette.table("light_emission", np.uint8)[state]
+        for channel, is_sky in ((self.sky, True), (self.block, False)):
+            a = channel[x]
+            relight = []
+            if a[y]:
+                old, a[y] = a[y], 0
+                self.changed.add((x, y))
+                relight = self._remove(channel, is_sky, [(x, y, old)])
+            if is_sky:
+                if opacity == 0 and (y == HEIGHT - 1 or a[y + 1] == MAX_LIGHT):
+                    a[y] = MAX_LIGHT
+            else:
+                a[y] = emission
+            if a[y]:
+                self.changed.add((x, y))
+                relight.append((x, y))
+            relight += [(nx, ny) for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1))
+                        if nx in channel and 0 <= ny < HEIGHT]
+            self._propagate(channel, is_sky, relight)
@@ -5,10 +5,13 @@ from menu_scene import MenuScene
 mod_pack = {
     "mods": ["minecraft"],
     "generator": "minecraft:SimpleGenerator",
+    "generator_config": {"seed": 0},
     "controller": ["minecraft:ExploreGravityControl"],
     "player": ("minecraft:Player", (-5, 110)),
-    "gravity": (0, -20)
+    "gravity": (0, -20),
+    "save": "saves/world"
 }
 
-app = Application("", (1, 1), 0)
-app.run(MenuScene(mod_pack))
+if __name__ == "__main__":
+    app = Application("", (1, 1), 0)
+    app.run(MenuScene(mod_pack))
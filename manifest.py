@@ -0,0 +1,232 @@
+import ast
+import json
+import os
+import sys
+import time
+from importlib import import_module
+from typing import Dict, List, Any, Iterable
+
+import pygame
+
+from textures import textures
+
+VERSION = 1
+
+# the engine base classes, everything derived from them in a mod is an item of that kind
+KINDS = {
+    "Block": "block",
+    "Object": "object",
+    "Generator": "generator",
+    "ControlHandler": "controller",
+    "Configuration": "configuration",
+}
+
+
+def _module_name(mods_dir: str, path: str) -> str:
+    rel = os.path.relpath(path, mods_dir)[:-len(".py")].split(os.sep)
+    if rel[-1] == "__init__":
+        rel = rel[:-1]
+    return ":".join(rel)
+
+
+def _base_name(node: ast.expr) -> str:
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return ""
+
+
+def scan(mods_dir: str = "mods") -> Dict[str, Any]:
+    """Finds the items of all mods by parsing their source, without importing anything.
+
+    Items are keyed like `get_mod_item` expects them (`"minecraft:blocks:Stone"`) with their module, kind
+    and the asset paths (png strings) in their class body."""
+    files = {}
+    classes = {}
+    for mod in sorted(os.listdir(mods_dir)):
+        if not os.path.isfile(os.path.join(mods_dir, mod, "__init__.py")):
+            continue
+        for root, dirs, names in os.walk(os.path.join(mods_dir, mod)):
+            dirs[:] = sorted(d for d in dirs if not d.startswith((".", "__")))
+            for name in sorted(names):
+                if not name.endswith(".py"):
+                    continue
+                path = os.path.join(root, name)
+                files[path] = os.stat(path).st_mtime
+                with open(path, encoding="utf-8") as f:
+                    tree = ast.parse(f.read(), path)
+                module = _module_name(mods_dir, path)
+                for node in tree.body:
+                    if isinstance(node, ast.ClassDef):
+                        assets = sorted({n.value for n in ast.walk(node) if isinstance(n, ast.Constant)
+                                         and isinstance(n.value, str) and n.value.endswith(".png")})
+                        classes[f"{module}:{node.name}"] = {
+                            "module": "mods." + module.replace(":", "."),
+                            "bases": [_base_name(b) for b in node.bases],
+                            "assets": assets,
+                        }
+    kinds = dict(KINDS)
+    changed = True
+    while changed:
+        changed = False
+        for item, c in classes.items():
+            name = item.rsplit(":", 1)[1]
+            kind = next((kinds[b] for b in c["bases"] if b in kinds), None)
+            if kind is not None and kinds.get(name) != kind and name not in KINDS:
+                kinds[name] = kind
+                changed = True
+    items = {}
+    for item, c in classes.items():
+        kind = next((kinds[b] for b in c["bases"] if b in kinds), None)
+        if kind is not None:
+            items[item] = {"module": c["module"], "kind": kind, "assets": c["assets"]}
+    assets = sorted({a for i in items.values() for a in i["assets"] if os.path.isfile(a)})
+    files.update({a: os.stat(a).st_mtime for a in assets})
+    return {"version": VERSION, "files": files, "items": items, "assets": assets}
+
+
+def pack_textures(assets: Iterable[str], path: str) -> Dict[str, List[int]]:
+    """Writes the decoded RGBA pixels of all assets into one file, returns {asset: [offset, width, height]}."""
+    index = {}
+    offset = 0
+    with open(path, "wb") as f:
+        for a in assets:
+            sur = pygame.image.load(a)
+            data = pygame.image.tostring(sur, "RGBA")
+            f.write(data)
+            index[a] = [offset, sur.get_width(), sur.get_height()]
+            offset += len(data)
+    return index
+
+
+class LazyModule:
+    """Stands in for a mod module in the `mods` dict, the module is imported when an attribute is first used."""
+
+    def __init__(self, name: str, loader: "ModLoader"):
+        self._name = name
+        self._loader = loader
+        self._module = None
+
+    def __getattr__(self, item):
+        if item.startswith("__"):
+            raise AttributeError(item)
+        if self._module is None:
+            self._module = self._loader.import_module(self._name)
+        return getattr(self._module, item)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}{'' if self._module is None else ' (loaded)'}>"
+
+
+class ModLoader:
+    """Loads mods from the manifest in `cache_dir`, which is rebuilt when a mod source or asset file changed.
+
+    `load` preloads the packed textures of the mods and returns lazy modules, mods are imported only when an item
+    of them is needed. For a `PlayScene` those are the mods with the generator, the controllers and the player of
+    the modpack, the others are imported when a block of them is decoded or an item of them is looked up. The time
+    spent on each step is kept for `report`."""
+
+    def __init__(self, mods_dir: str = "mods", cache_dir: str = ".cache"):
+        self.mods_dir = mods_dir
+        self.cache_dir = cache_dir
+        self.started = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+        self.cached = None
+        self._manifest: Dict[str, Any] = None
+
+    def _timed(self, name: str, start: float):
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, "manifest.json")
+
+    @property
+    def textures_path(self) -> str:
+        return os.path.join(self.cache_dir, "textures.bin")
+
+    def _fresh(self, manifest: Dict[str, Any]) -> bool:
+        if manifest.get("version") != VERSION or not os.path.isfile(self.textures_path):
+            return False
+        for path, mtime in manifest["files"].items():
+            if not os.path.isfile(path) or os.stat(path).st_mtime != mtime:
+                return False
+        # new files
+        for root, dirs, names in os.walk(self.mods_dir):
+            for name in names:
+                if name.endswith(".py") and os.path.join(root, name) not in manifest["files"]:
+                    return False
+        return True
+
+    def build(self) -> Dict[str, Any]:
+        t = time.perf_counter()
+        manifest = scan(self.mods_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest["textures"] = pack_textures(manifest["assets"], self.textures_path)
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f)
+        self._timed("build manifest", t)
+        return manifest
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        if self._manifest is None:
+            t = time.perf_counter()
+            manifest = None
+            if os.path.isfile(self.manifest_path):
+                with open(self.manifest_path) as f:
+                    manifest = json.load(f)
+            self._timed("read manifest", t)
+            self.cached = manifest is not None and self._fresh(manifest)
+            self._manifest = manifest if self.cached else self.build()
+        return self._manifest
+
+    def import_module(self, name: str):
+        t = time.perf_counter()
+        try:
+            return import_module(name)
+        finally:
+            self._timed("import " + name, t)
+
+    def preload_textures(self, mods: Iterable[str]):
+        t = time.perf_counter()
+        index = self.manifest["textures"]
+        mods = set(mods)
+        wanted = {a for i in self.manifest["items"].values() if i["module"].split(".")[1] in mods
+                  for a in i["assets"] if a in index and a not in textures}
+        if wanted:
+            with open(self.textures_path, "rb") as f:
+                blob = f.read()
+            for a in wanted:
+                offset, w, h = index[a]
+                textures.add(a, pygame.image.frombuffer(blob[offset:offset + w * h * 4], (w, h), "RGBA"))
+        self._timed("preload textures", t)
+
+    def items(self, kind: str = None) -> Dict[str, Dict[str, Any]]:
+        return {n: i for n, i in self.manifest["items"].items() if kind is None or i["kind"] == kind}
+
+    def load(self, mods: Iterable[str]) -> Dict[str, LazyModule]:
+        mods = list(mods)
+        self.preload_textures(mods)
+        return {n: LazyModule(f"mods.{n}", self) for n in mods}
+
+    def mark(self, name: str):
+        """Records the time since the loader was created under `name`."""
+        self.timings[name] = time.perf_counter() - self.started
+
+    def report(self) -> str:
+        lines = [f"manifest {'cached' if self.cached else 'rebuilt'}"]
+        lines += [f"{n:<40} {t * 1000:8.1f} ms" for n, t in self.timings.items()]
+        return "\n".join(lines)
+
+
+loader = ModLoader()
+
+
+if __name__ == "__main__":
+    m = loader.build()
+    print(f"{len(m['items'])} items, {len(m['textures'])} textures")
+    for n, i in sorted(m["items"].items()):
+        print(f"{i['kind']:<14} {n}")
+    print(loader.report(), file=sys.stderr)
@@ -1,32 +1,181 @@
+import numpy as np
 import pygame
-from noise import pnoise1 as noise
+from numpy.lib.stride_tricks import sliding_window_view
 
+from CONFIGURATION import HEIGHT
+from config import Configuration
 from control_handler import ControlHandler
-from generator import Generator
+from generator import Generator, column_random
 from mods.minecraft import blocks
 from object import Object
-from util import is_pressed, Vec2d
+from perlin import Noise
+from util import Vec2d
+
+
+class SimpleGeneratorConfiguration(Configuration):
+    defaults = {
+        "seed": 0,
+        "height_scale": 0.01,
+        "biome_scale": 0.002,
+        "cave_scale": 0.04,
+        "cave_threshold": 0.07,
+        "snow_line": 140,
+        "tree_density": 0.3,
+        "house_density": 0.01,
+        "sea_level": 88,
+    }
 
 
 class SimpleGenerator(Generator):
-    def _generate(self, x: int):
-        l = []
-        y = 0
-        for _ in range(round((noise(x * 0.01) + 1) * 50) + 50):
-            l.append(blocks.Stone((x, y)))
-            y += 1
-        for _ in range(3):
-            l.append(blocks.Dirt((x, y)))
-            y += 1
-        l.append(blocks.Grass((x, y)))
-        y += 1
-        for _ in range(5):
-            l.append(blocks.Air((x, y)))
-            y += 1
-        for _ in range(255 - len(l)):
-            l.append(blocks.Air((x, y)))
-            y += 1
-        self._generated[x] = l
+    configuration_class = SimpleGeneratorConfiguration
+    # biomes in order of the biome noise: desert, plains, mountains
+    biome_bounds = (-0.25, 0.3)
+    # houses are 7 columns wide, tree leaves reach 2 columns to the side
+    structure_radius = 3
+    plan_chunk = 64
+
+    def __init__(self, configuration=None, palette=None):
+        super().__init__(configuration, palette)
+        self._noise = None
+        self._trees = {}
+
+    def _noises(self):
+        c = self.configuration
+        if self._noise is None or self._noise[0].seed != c.seed:
+            self._noise = Noise(c.seed), Noise(c.seed + 1), Noise(c.seed + 2)
+        return self._noise
+
+    def _surface(self, x0: int, x1: int):
+        """Biome noise and surface height of the columns x0 <= x < x1."""
+        c = self.configuration
+        height_noise, biome_noise, _ = self._noises()
+        # the surface doesn't depend on the cave and snow settings, changing those keeps it
+        surface = self._stage("surface", ("seed", "biome_scale", "height_scale"))
+        if all(x in surface for x in range(x0, x1)):
+            return np.array([surface[x] for x in range(x0, x1)]).T
+        xs = np.arange(x0, x1)
+        b = biome_noise.fractal1(xs * c.biome_scale, 2)
+        # base height and roughness change smoothly with the biome noise, so there are no cliffs at biome borders
+        base = np.interp(b, (-1, -0.25, 0.3, 1), (85, 90, 100, 115))
+        amplitude = np.interp(b, (-1, -0.25, 0.3, 1), (8, 15, 25, 60))
+        height = np.clip(np.round(base + amplitude * height_noise.fractal1(xs * c.height_scale, 4)), 8, HEIGHT - 8)
+        surface.update(zip(range(x0, x1), zip(b.tolist(), height.tolist())))
+        return b, height
+
+    def _generate_range(self, x0: int, x1: int):
+        c = self.configuration
+        _, _, cave_noise = self._noises()
+        p = self.palette
+        air, stone, bedrock = p.index(blocks.Air), p.index(blocks.Stone), p.index(blocks.Bedrock)
+        tops = np.array([p.index(blocks.Sand), p.index(blocks.Grass), stone], p.dtype)
+        fillers = np.array([p.index(blocks.Sand), p.index(blocks.Dirt), stone], p.dtype)
+
+        xs = np.arange(x0, x1)
+        b, height = self._surface(x0, x1)
+        biome = np.digitize(b, self.biome_bounds)
+
+        ys = np.arange(HEIGHT)[None, :]
+        h = height.astype(int)[:, None]
+        grid = np.full((len(xs), HEIGHT), air, p.dtype)
+        grid[ys < h] = stone
+        filler = (ys >= h - 3) & (ys < h)
+        grid[filler] = np.broadcast_to(fillers[biome][:, None], grid.shape)[filler]
+        top = np.where((biome == 2) & (height > c.snow_line), p.index(blocks.Snow), tops[biome])
+        # sand under water, the water fills everything up to the sea level
+        top = np.where(height < c.sea_level, p.index(blocks.Sand), top)
+        grid[np.arange(len(xs)), h[:, 0]] = top
+        grid[(ys > h) & (ys <= c.sea_level)] = p.index(blocks.Water)
+        # caves only need to be evaluated below the highest surface
+        top_y = max(h.max() - 4, 5)
+        cave_ys = ys[:, 5:top_y]
+        caves = np.abs(cave_noise.fractal2(xs[:, None] * c.cave_scale, cave_ys * c.cave_scale * 1.5, 2)) < c.cave_threshold
+        grid[:, 5:top_y][caves & (cave_ys < h - 4)] = air
+        grid[:, 0] = bedrock
+
+        for i, x in enumerate(range(x0, x1)):
+            if x not in self._terrain:
+                self._terrain[x] = grid[i].copy()
+
+    @staticmethod
+    def _sparse(mask: np.ndarray, values: np.ndarray, distance: int) -> np.ndarray:
+        """Of the entries in `mask` only those with the smallest value within `distance`."""
+        v = np.pad(np.where(mask, values, np.inf), distance, constant_values=np.inf)
+        return mask & (values <= sliding_window_view(v, 2 * distance + 1).min(1))
+
+    def _plan(self, x0: int, x1: int):
+        """(x, is house, ground height, variant) of the structures starting in the columns x0 <= x < x1."""
+        c = self.configuration
+        # structures only depend on the seed and the surface, which are known for any column,
+        # so the neighbours they have to keep their distance to are found outside of x0..x1 too
+        m = 16
+        xs = np.arange(x0 - m, x1 + m)
+        b, height = self._surface(x0 - m - 3, x1 + m + 3)
+        h = height.astype(int)
+        biome = np.digitize(b[3:-3], self.biome_bounds)
+        r = column_random(c.seed, xs, 3)
+        dry = h[3:-3] >= c.sea_level
+        grass = dry & ((biome == 1) | (biome == 2) & (h[3:-3] <= c.snow_line))
+
+        around = sliding_window_view(h, 7)
+        flat = (around.max(1) - around.min(1) <= 1) & (around.min(1) >= c.sea_level)
+        houses = self._sparse((r[:, 0] < c.house_density) & (biome == 1) & flat, r[:, 0], 7)
+        near_house = sliding_window_view(np.pad(houses, 6), 13).any(1)
+        trees = self._sparse((r[:, 1] < c.tree_density) & grass & ~near_house, r[:, 1], 2)
+
+        plan = []
+        for i in np.flatnonzero(houses[m:-m] | trees[m:-m]) + m:
+            if houses[i]:
+                plan.append((int(xs[i]), True, int(around[i].max()), float(r[i, 2])))
+            else:
+                plan.append((int(xs[i]), False, int(h[i + 3]), float(r[i, 2])))
+        return plan
+
+    def _decorate_range(self, x0: int, x1: int):
+        # planned in aligned chunks, so generating single columns doesn't evaluate the surroundings every time
+        n = self.plan_chunk
+        plans = self._stage("structures", ("seed", "biome_scale", "height_scale", "snow_line", "tree_density",
+                                           "house_density", "sea_level"))
+        chunks = range(x0 // n * n, x1, n)
+        missing = [chunk for chunk in chunks if chunk not in plans]
+        if missing:
+            for chunk in range(missing[0], missing[-1] + n, n):
+                plans[chunk] = []
+            for structure in self._plan(missing[0], missing[-1] + n):
+                plans[structure[0] // n * n].append(structure)
+        for chunk in chunks:
+            for x, house, y, variant in plans[chunk]:
+                if x0 <= x < x1:
+                    (self._house if house else self._tree)(x, y, variant)
+
+    def _tree(self, x: int, ground: int, variant: float):
+        trunk = 4 + int(variant * 3)
+        shape = self._trees.get(trunk)
+        if shape is None:
+            p = self.palette
+            log, leaves = p.index(blocks.Log), p.index(blocks.Leaves)
+            # leaves only grow into air
+            air = (p.index(blocks.Air),)
+            shape = [(0, 1, np.full(trunk, log, np.int32), None)]
+            for dx, y0, y1 in ((-2, -2, 0), (-1, -2, 2), (0, 1, 2), (1, -2, 2), (2, -2, 0)):
+                shape.append((dx, trunk + y0, np.full(y1 - y0, leaves, np.int32), air))
+            self._trees[trunk] = shape
+        for dx, y, column, replace in shape:
+            self.place(x, x + dx, ground + y, column, replace)
+
+    def _house(self, x: int, floor: int, variant: float):
+        p = self.palette
+        air, log, planks, torch = (p.index(b) for b in (blocks.Air, blocks.Log, blocks.Planks, blocks.Torch))
+        door = -3 if variant < 0.5 else 3
+        for dx in range(-3, 4):
+            column = np.array([planks, air, air, air, air, planks, planks], np.int32)
+            if abs(dx) == 3:
+                column[1:5] = log
+                column[6] = -1
+            if dx == door:
+                column[1:3] = air
+            if dx == -door // 3 * 2:
+                column[3] = torch
+            self.place(x, x + dx, floor, column)
 
 
 class Player(Object):
@@ -47,12 +196,18 @@ class Player(Object):
         "left_arm": ("steve", (32, 48, 16, 16), 4)
     }
     size = (0.75, 2)
+    pose_steps = {
+        "head_rotation": 4,
+        "foot_step": 3,
+    }
+    prewarm_faces = ("right", "left")
 
     def _render(self):
         self._image = pygame.Surface((32, 64), pygame.SRCALPHA)
-        head_rotation = self.data["head_rotation"]
-        foot_step = self.data["foot_step"]
-        if 90 > self.data["head_rotation"] > -90:
+        pose = self.pose
+        head_rotation = pose["head_rotation"]
+        foot_step = pose["foot_step"]
+        if 90 > head_rotation > -90:
             self.images["left_arm"].right.blit_onto(self._image, foot_step * 0.75, (16, 26))
             self.images["body"].right.blit_onto(self._image, 0, (16, 30))
             self.images["head"].right.blit_onto(self._image, head_rotation, (16, 24))
@@ -85,31 +240,36 @@ class Player(Object):
 
 class ExploreGravityControl(ControlHandler):
     repeat_args = (1, 1)
-    s = 0.75
+    # blocks per second, and degrees the legs swing per block walked
+    speed = 10 / 3
+    s = 45
 
     def update(self, dt):
         v = self.scene.player.velocity
-        if is_pressed(pygame.K_LEFT):
-            v.x = -200 * dt
+        if self.input.is_pressed(pygame.K_LEFT):
+            v.x = -self.speed
             self.scene.player.data["look_direction"] = "left"
-        elif is_pressed(pygame.K_RIGHT):
-            v.x = 200 * dt
+        elif self.input.is_pressed(pygame.K_RIGHT):
+            v.x = self.speed
             self.scene.player.data["look_direction"] = "right"
         else:
             v.x = 0
             self.scene.player.data["foot_step"] = 0
         self.scene.player.velocity = v
-        p = self.scene.player.pos
-        r = self.scene.application.resolution
-        self.scene.scroll = [p.x * 16 - r[0] / 2 + 16, p.y * 16 - r[1] / 2]
-        self.scene.player.data["foot_step"] += v.x * self.s
+        r = self.scene.resolution
+        self.scene.player.data["foot_step"] += v.x * dt * self.s
         if -45 > self.scene.player.data["foot_step"]:
             self.s *= -1
             self.scene.player.data["foot_step"] = -45
         if 45 < self.scene.player.data["foot_step"]:
             self.s *= -1
             self.scene.player.data["foot_step"] = 45
-        self.scene.player.data["head_rotation"] = (Vec2d(pygame.mouse.get_pos()) - (r[0] / 2 - 16, r[1] / 2)).rotation - 90
+        self.scene.player.data["head_rotation"] = (Vec2d(self.input.mouse_pos()) - (r[0] / 2 - 16, r[1] / 2)).rotation - 90
+
+    def frame(self, alpha):
+        p = self.scene.world.interpolated_pos(self.scene.player)
+        r = self.scene.application.resolution
+        self.scene.scroll = [p.x * 16 - r[0] / 2 + 16, p.y * 16 - r[1] / 2]
 
     def handle(self, event: pygame.event.EventType):
         if event.type == pygame.KEYDOWN:
@@ -1,6 +1,9 @@
 import pygame
 
+from CONFIGURATION import HEIGHT
 from block import Block
+from fluid import FluidBlock
+from textures import block_atlas
 from util import Rect
 
 
@@ -8,17 +11,18 @@ class StateBlock(Block):
     default = None
 
     def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
         cls.allowed_data = {"state": list(cls.image_paths.keys())}
         if cls.default is not None:
             cls.allowed_data["state"].remove(cls.default)
             cls.allowed_data["state"].insert(0, cls.default)
 
     def _render(self):
-        self._image = self.images[self.data["state"]]
+        self._image = block_atlas.get(self.image_paths[self.data["state"]])
         self._draw_offset = 0, 0
 
     def _render_rect(self):
-        self._rect = Rect(tuple(self.pos), (self._image.get_size()[0] / 16, self._image.get_size()[1] / 16))
+        self._rect = Rect((0, 0), (self._image.get_size()[0] / 16, self._image.get_size()[1] / 16))
 
 
 class Air(StateBlock):
@@ -40,10 +44,113 @@ class Stone(StateBlock):
     }
 
 
+class Sand(StateBlock):
+    image_paths = {
+        "normal": "assets/minecraft/textures/blocks/sand.png"
+    }
+    neighbor_updates = True
+    fall_delay = 2
+
+    def neighbor_changed(self, world, pos):
+        x, y = pos
+        if y > 0 and not world.get_block((x, y - 1)).has_collision:
+            world.ticks.schedule(pos, self.fall_delay, type(self))
+
+    def scheduled_tick(self, world, pos):
+        x, y = pos
+        if y > 0 and not world.get_block((x, y - 1)).has_collision:
+            # the moved block checks the block under it again, so it keeps falling
+            with world.edit():
+                world.set_block(pos, Air)
+                world.set_block((x, y - 1), self)
+
+
+class Snow(StateBlock):
+    image_paths = {
+        "normal": "assets/minecraft/textures/blocks/snow.png"
+    }
+
+
+class Bedrock(StateBlock):
+    image_paths = {
+        "normal": "assets/minecraft/textures/blocks/bedrock.png"
+    }
+
+
 class Grass(StateBlock):
     image_paths = {
         "normal": "assets/minecraft/textures/blocks/grass_side.png"
     }
+    random_ticks = True
+
+    def random_tick(self, world, pos):
+        x, y = pos
+        # without light from above it dies
+        if y + 1 < HEIGHT and world.get_block((x, y + 1)).light_opacity >= 15:
+            world.set_block(pos, Dirt)
+            return
+        # spreads to dirt nearby that gets light
+        r = world.ticks.random
+        nx, ny = x + r.randint(-1, 1), y + r.randint(-3, 1)
+        if nx not in world.loaded_columns() or not 0 <= ny < HEIGHT - 1:
+            return
+        target = world.get_block((nx, ny))
+        if isinstance(target, Dirt) and target.data["state"] == "normal" \
+                and world.get_block((nx, ny + 1)).light_opacity < 15:
+            world.set_block((nx, ny), Grass)
     # def add_to(self, space, position):
     #     super(Grass, self).add_to(space,position)
     #     print(self.shape.get_vertices())
+
+
+class Torch(StateBlock):
+    has_collision = False
+    light_emission = 14
+    image_paths = {
+        "normal": "assets/minecraft/textures/blocks/torch_on.png"
+    }
+
+
+class Log(StateBlock):
+    image_paths = {
+        "oak": "assets/minecraft/textures/blocks/log_oak.png"
+    }
+
+
+class Leaves(StateBlock):
+    image_paths = {
+        "oak": "assets/minecraft/textures/blocks/leaves_oak.png"
+    }
+
+    @property
+    def light_opacity(self) -> int:
+        return 1
+
+
+class Planks(StateBlock):
+    image_paths = {
+        "oak": "assets/minecraft/textures/blocks/planks_oak.png"
+    }
+
+
+class Obsidian(StateBlock):
+    image_paths = {
+        "normal": "assets/minecraft/textures/blocks/obsidian.png"
+    }
+
+
+class Water(FluidBlock):
+    image_paths = {
+        "still": "assets/minecraft/textures/blocks/water_still.png"
+    }
+    empty = Air
+
+
+class Lava(FluidBlock):
+    image_paths = {
+        "still": "assets/minecraft/textures/blocks/lava_still.png"
+    }
+    light_emission = 15
+    flow_interval = 18
+    empty = Air
+    contact = {Water: (Obsidian, Stone)}
@@ -1,8 +1,13 @@
-from typing import Dict, Any, Tuple
+import threading
+from collections import OrderedDict
+from math import ceil
+from typing import Dict, Any, Tuple, Iterable, List
 
 import pygame
 
-from util import Vec2d, Rect
+from entities import EntityStore, SlotRect
+from textures import textures
+from util import Vec2d, Rect, LimitedSizeDict
 
 
 def rotate_image(img, rotation) -> Tuple[pygame.Surface, Tuple[int, int]]:
@@ -10,27 +15,89 @@ def rotate_image(img, rotation) -> Tuple[pygame.Surface, Tuple[int, int]]:
     return rotated_image,
 
 
+class RotationCache:
+    """Rotated surfaces shared between all `RotationSurface`s with the same key.
+
+    Angles are rounded to multiples of `resolution` degrees. Once the rotated images take more than `budget` bytes,
+    the least recently used ones are dropped."""
+
+    def __init__(self, budget: int = 16 * 2 ** 20, resolution: float = 1):
+        self.budget = budget
+        self.resolution = resolution
+        self._images: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._bytes
+
+    def angle(self, rotation: float) -> float:
+        return round(rotation / self.resolution) * self.resolution % 360
+
+    def get(self, key, surface: pygame.Surface, rotation: float) -> pygame.Surface:
+        k = (key, self.angle(rotation))
+        with self._lock:
+            img = self._images.get(k)
+            if img is not None:
+                self._images.move_to_end(k)
+                return img
+        img = pygame.transform.rotate(surface, k[1])
+        with self._lock:
+            if k not in self._images:
+                self._images[k] = img
+                self._bytes += img.get_bytesize() * img.get_width() * img.get_height()
+                while self._bytes > self.budget and len(self._images) > 1:
+                    _, old = self._images.popitem(last=False)
+                    self._bytes -= old.get_bytesize() * old.get_width() * old.get_height()
+        return img
+
+    def prewarm(self, items: Iterable[Tuple[Any, pygame.Surface]], background: bool = False):
+        """Rotates every (key, surface) to all angles, in a daemon thread if `background`."""
+        items = list(items)
+        if background:
+            threading.Thread(target=self.prewarm, args=(items,), daemon=True).start()
+            return
+        angles = [i * self.resolution for i in range(ceil(360 / self.resolution))]
+        for key, surface in items:
+            for angle in angles:
+                self.get(key, surface, angle)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._bytes = 0
+
+
+rotations = RotationCache()
+
+
 class BodyPart:
-    def __init__(self, image: pygame.Surface, size):
+    def __init__(self, image: pygame.Surface, size, key=None):
         w1 = size
         w2 = image.get_width() / 2 - w1
         h1 = size
         h2 = image.get_height() - h1
-        self.top = RotationSurface(image.subsurface((w1, 0, w2, h1)))
-        self.bottom = RotationSurface(image.subsurface((w1 + w2, 0, w2, h1)))
-        self.right = RotationSurface(image.subsurface((0, h1, w1, h2)))
-        self.left = RotationSurface(image.subsurface((w1 + w2, h1, w1, h2)))
-        self.front = RotationSurface(image.subsurface((w1, h1, w2, h2)))
-        self.back = RotationSurface(image.subsurface((w1 * 2 + w2, h1, w2, h2)))
+        key = key if key is not None else object()
+        self.top = RotationSurface(image.subsurface((w1, 0, w2, h1)), key=(key, "top"))
+        self.bottom = RotationSurface(image.subsurface((w1 + w2, 0, w2, h1)), key=(key, "bottom"))
+        self.right = RotationSurface(image.subsurface((0, h1, w1, h2)), key=(key, "right"))
+        self.left = RotationSurface(image.subsurface((w1 + w2, h1, w1, h2)), key=(key, "left"))
+        self.front = RotationSurface(image.subsurface((w1, h1, w2, h2)), key=(key, "front"))
+        self.back = RotationSurface(image.subsurface((w1 * 2 + w2, h1, w2, h2)), key=(key, "back"))
 
 
 class RotationSurface(pygame.Surface):
-    def __init__(self, sur: pygame.Surface, rotation_point=None):
+    """`sur` padded so that `rotation_point` is the center. Rotations are taken from `cache`; surfaces with equal
+    `key` must have the same content, without a key nothing is shared."""
+
+    def __init__(self, sur: pygame.Surface, rotation_point=None, key=None, cache: RotationCache = None):
         self._sur = sur
         super(RotationSurface, self).__init__((sur.get_width() * 2, sur.get_height() * 2), pygame.SRCALPHA)
+        self._key = key if key is not None else object()
+        self.cache = cache if cache is not None else rotations
         self._rotation_point = None
         self.rotation_point = rotation_point if rotation_point is not None else sur.get_rect().center
-        self._cache = {}
 
     @property
     def rotation_point(self):
@@ -38,52 +105,90 @@ class RotationSurface(pygame.Surface):
 
     @rotation_point.setter
     def rotation_point(self, value):
-        self._rotation_point = value
+        self._rotation_point = tuple(value)
         self.fill((0, 0, 0, 0))
-        self._cache = {}
         self.blit(self._sur, (self._sur.get_width() - value[0], self._sur.get_height() - value[1]))
 
+    @property
+    def key(self):
+        return self._key, self._rotation_point
+
     def blit_onto(self, screen, rotation, center_pos):
-        rotation = round(rotation)
-        if rotation in self._cache:
-            img = self._cache[rotation]
-        else:
-            print("create")
-            img = pygame.transform.rotate(self, rotation)
-            self._cache[rotation] = img
+        img = self.cache.get(self.key, self, rotation)
         r = img.get_rect(center=center_pos)
         screen.blit(img, r)
 
 
 class Object:
+    """Physical state (box, velocity, flags) lives in an `EntityStore`, the object is a handle to its slot there.
+
+    `_render` should draw from `pose`, the data with the fields in `pose_steps` rounded to multiples of their step.
+    Rendered frames are shared by all objects of a class with the same skin (`image_paths`) and pose,
+    the last `pose_cache_size` of them are kept."""
     size = (1, 1)
     image_paths = {}
     allowed_data = {}
     image_parts: Dict[str, Tuple[str, Tuple[int, int, int, int], int]]
     has_shape = True
+    pose_steps: Dict[str, float] = {}
+    prewarm_faces: Tuple[str, ...] = ()
+    pose_cache_size = 256
+    _poses: Dict[Tuple, LimitedSizeDict] = {}
 
     def __init__(self, pos, data=None):
         self.base_images = {}
         for n, p in self.image_paths.items():
-            self.base_images[n] = pygame.image.load(p)
-        self._velocity: Vec2d = Vec2d((0, 0))
+            self.base_images[n] = textures.load(p)
+        # until it is added to a world the object has a store of its own, freed with it
+        self._store = EntityStore(1)
+        self._slot = self._store.allocate(self)
+        self._store.pos[self._slot] = tuple(pos)
+        self._store.size[self._slot] = self.size
+        self._rect = SlotRect(self)
         self.images: Dict[str, BodyPart] = {}
         for n, v in self.image_parts.items():
-            self.images[n] = BodyPart(self.base_images[v[0]].subsurface(v[1]), v[2])
+            self.images[n] = BodyPart(self.base_images[v[0]].subsurface(v[1]), v[2], (self.image_paths[v[0]],) + v[1:])
         self._data: Dict[str, Any] = None
         self._hash = None
         self._image = None
-        self._rect = Rect(pos, self.size)
         self._draw_offset = None
         self.data = data or {}
-        self.one_ground = False
         self.setup()
 
+    def _move_to(self, store: EntityStore):
+        if store is not self._store:
+            self._slot = self._store.transfer(self._slot, store)
+            self._store = store
+
     def __str__(self):
         return f"{self.id} {self.data}"
 
     def _get_hash(self):
-        return hash(tuple(self._data.items()))
+        return hash(tuple(self.pose.items()))
+
+    @property
+    def pose(self) -> Dict[str, Any]:
+        pose = dict(self._data)
+        for n, step in self.pose_steps.items():
+            pose[n] = round(pose[n] / step) * step
+        return pose
+
+    def _update_image(self):
+        pose = tuple(self.pose.items())
+        h = hash(pose)
+        if self._hash == h:
+            return
+        key = (self.__class__, tuple(sorted(self.image_paths.items())))
+        cache = Object._poses.get(key)
+        if cache is None:
+            cache = Object._poses[key] = LimitedSizeDict(size_limit=self.pose_cache_size)
+        if pose in cache:
+            cache.move_to_end(pose)
+            self._image, self._draw_offset = cache[pose]
+        else:
+            self._render()
+            cache[pose] = self._image, self._draw_offset
+        self._hash = h
 
     def setup(self):
         pass
@@ -117,35 +222,53 @@ class Object:
         self._rect.center = tuple(value)
 
     @property
-    def velocity(self):
-        return self._velocity
+    def velocity(self) -> Vec2d:
+        return Vec2d(self._store.velocity[self._slot].tolist())
 
     @velocity.setter
     def velocity(self, value):
-        self._velocity = Vec2d(value)
+        self._store.velocity[self._slot] = tuple(value)
+
+    @property
+    def one_ground(self) -> bool:
+        return bool(self._store.on_ground[self._slot])
+
+    @one_ground.setter
+    def one_ground(self, value):
+        self._store.on_ground[self._slot] = value
+
+    @property
+    def one_wall(self) -> bool:
+        return bool(self._store.on_wall[self._slot])
+
+    @one_wall.setter
+    def one_wall(self, value):
+        self._store.on_wall[self._slot] = value
 
     def _render(self):
         raise NotImplementedError
 
+    def prewarm(self, background: bool = False):
+        """Fills the rotation caches the `prewarm_faces` of all body parts draw from with every angle."""
+        caches: Dict[RotationCache, List[Tuple[Any, RotationSurface]]] = {}
+        for part in self.images.values():
+            for face in (getattr(part, f) for f in self.prewarm_faces):
+                caches.setdefault(face.cache, []).append((face.key, face))
+        for cache, items in caches.items():
+            cache.prewarm(items, background)
+
     @property
     def image(self) -> pygame.Surface:
-        if self._hash != self._get_hash():
-            self._render()
-            self._hash = self._get_hash()
+        self._update_image()
         return self._image
 
     @property
     def draw_offset(self):
-        if self._hash != self._get_hash():
-            self._render()
-            self._hash = self._get_hash()
+        self._update_image()
         return self._draw_offset
 
     @property
     def rect(self) -> Rect:
-        if self._hash != self._get_hash():
-            self._render()
-            self._hash = self._get_hash()
         return self._rect
 
     @property
@@ -0,0 +1,83 @@
+from typing import Dict, List, Type, Union, Any
+
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from block import Block
+
+
+class Palette:
+    """Interns block states (class + data). Columns store indices into a palette instead of Block objects."""
+    dtype = np.uint16
+
+    def __init__(self):
+        self._states: List[Block] = []
+        self._index: Dict[tuple, int] = {}
+        self._defaults: Dict[Type[Block], int] = {}
+        self._tables: Dict[str, np.ndarray] = {}
+
+    def __getstate__(self):
+        # Block states cache rendered surfaces, which can't be pickled
+        return [(type(s), dict(s.data)) for s in self._states]
+
+    def __setstate__(self, state):
+        self.__init__()
+        for block, data in state:
+            self.index(block, data)
+
+    def __len__(self):
+        return len(self._states)
+
+    def __getitem__(self, item) -> Block:
+        return self._states[item]
+
+    def __iter__(self):
+        return iter(self._states)
+
+    def index(self, block: Union[Block, Type[Block]], data: Dict[str, Any] = None) -> int:
+        if not isinstance(block, Block):
+            if not data and block in self._defaults:
+                return self._defaults[block]
+            i = self.index(block(data))
+            if not data:
+                self._defaults[block] = i
+            return i
+        key = block.key
+        if key not in self._index:
+            if len(self._states) > np.iinfo(self.dtype).max:
+                raise OverflowError("too many block states in palette")
+            self._index[key] = len(self._states)
+            self._states.append(block)
+        return self._index[key]
+
+    def table(self, attribute: str, dtype=None) -> np.ndarray:
+        """Array with the value of a block attribute for every palette index. Used as `table[column]`."""
+        t = self._tables.get(attribute)
+        if t is None or len(t) != len(self._states):
+            t = np.array([getattr(s, attribute) for s in self._states], dtype=dtype)
+            self._tables[attribute] = t
+        return t
+
+    def column(self, fill: Union[Block, Type[Block]]) -> np.ndarray:
+        return np.full(HEIGHT, self.index(fill), self.dtype)
+
+
+class Column:
+    """Lightweight view of a column array, yielding the shared Block state of each cell."""
+    __slots__ = ("palette", "array")
+
+    def __init__(self, palette: Palette, array: np.ndarray):
+        self.palette = palette
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.palette[i] for i in self.array[item]]
+        return self.palette[self.array[item]]
+
+    def __iter__(self):
+        for i in self.array:
+            yield self.palette[i]
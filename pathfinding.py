@@ -0,0 +1,238 @@
+import heapq
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Deque, Callable
+
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from util import LimitedSizeDict
+
+pos = Tuple[int, int]
+
+WALK_COST = 1.0
+JUMP_COST = 2.0
+FALL_COST = 0.25
+
+
+class PathRequest:
+    """A search from `start` to `goal` (cells the feet are in), advanced by `Pathfinder.update` until `done`.
+
+    Then `path` is the list of cells from start to goal, or None if the goal can't be reached. `partial` is the
+    way to the reached cell closest to the goal, for walking as far as possible anyway."""
+
+    def __init__(self, start: pos, goal: pos, callback: Optional[Callable[["PathRequest"], None]] = None):
+        self.start = start
+        self.goal = goal
+        self.callback = callback
+        self.done = False
+        self.cancelled = False
+        self.path: Optional[List[pos]] = None
+        self.partial: Optional[List[pos]] = None
+        self.expanded = 0
+        self._open = [(abs(goal[0] - start[0]), 0, start)]
+        self._cost: Dict[pos, float] = {start: 0.0}
+        self._came_from: Dict[pos, Optional[pos]] = {start: None}
+        self._closest = start
+        # the columns of the expanded cells, the moves of a cell depend on the columns next to it as well
+        self.span = [min(start[0], goal[0]), max(start[0], goal[0])]
+
+    def cancel(self):
+        self.cancelled = True
+
+    def _trace(self, node: pos) -> List[pos]:
+        path = []
+        while node is not None:
+            path.append(node)
+            node = self._came_from[node]
+        return path[::-1]
+
+    def _finish(self, found: bool):
+        self.done = True
+        if found:
+            self.path = self._trace(self.goal)
+        self.partial = self.path or self._trace(self._closest)
+        self._open = self._cost = self._came_from = None
+        if self.callback is not None:
+            self.callback(self)
+
+
+class Pathfinder:
+    """A* over the cells an object `height` cells tall can stand in, moving sideways by walking, jumping up to
+    `jump_height` cells and falling at most `max_fall` cells.
+
+    The moves of every standing cell are computed per region of `region_size` columns with array operations on
+    the solid cells and kept until a block in or next to the region changes its collision, or a column is loaded,
+    unloaded or regenerated. Columns that aren't loaded count as solid. Requests are searched a chunk of nodes
+    at a time, `update` works through them until `budget` nodes were taken off the open sets and goes on in the
+    next tick. The budget is a node count and not a time, so a search ends on the same tick on every machine."""
+
+    def __init__(self, world, height: int = 2, jump_height: int = 1, max_fall: int = 3, budget: int = 1024,
+                 max_nodes: int = 5000, region_size: int = 16, cache_size: int = 256, chunk: int = 64):
+        self.world = world
+        self.height = height
+        self.jump_height = jump_height
+        self.max_fall = max_fall
+        self.budget = budget
+        self.max_nodes = max_nodes
+        self.region_size = region_size
+        self.chunk = chunk
+        self._regions: Dict[int, Dict[pos, List[Tuple[int, int, float]]]] = LimitedSizeDict(size_limit=cache_size)
+        self._results: Dict[Tuple[pos, pos], PathRequest] = LimitedSizeDict(size_limit=1024)
+        self._queue: Deque[PathRequest] = deque()
+        self.searches = 0
+        world.subscribe(self._changed)
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _changed(self, changes):
+        xs = {c.pos[0] for c in changes if c.old.has_collision != c.new.has_collision}
+        for x in xs:
+            self.invalidate(x)
+
+    def invalidate(self, x: int):
+        """Forgets the moves and the search results that could depend on column `x`."""
+        for r in {(x - 1) // self.region_size, (x + 1) // self.region_size}:
+            self._regions.pop(r, None)
+        for key in [k for k, req in self._results.items() if req.span[0] - 1 <= x <= req.span[1] + 1]:
+            del self._results[key]
+
+    def _region(self, r: int) -> Dict[pos, List[Tuple[int, int, float]]]:
+        moves = self._regions.get(r)
+        if moves is None:
+            moves = self._regions[r] = self._build(r)
+        return moves
+
+    def _build(self, r: int) -> Dict[pos, List[Tuple[int, int, float]]]:
+        """{standing cell: [(x, y, cost) of the cells it can move to]} of the columns of region `r`."""
+        world = self.world
+        blocks = world._blocks
+        x0 = r * self.region_size
+        xs = range(x0 - 1, x0 + self.region_size + 1)
+        solid = np.stack([world.solid_column(x) if x in blocks else np.ones(HEIGHT, bool) for x in xs])
+        free = ~solid
+        h = self.height
+        # the object fits with its feet in the cell
+        fits = free.copy()
+        for i in range(1, h):
+            fits[:, :-i] &= free[:, i:]
+            fits[:, -i:] = False
+        stands = fits.copy()
+        stands[:, 0] = False
+        stands[:, 1:] &= solid[:, :-1]
+        # feet falling down from a cell land above the highest solid cell under it
+        ys = np.arange(HEIGHT)
+        highest = np.maximum.accumulate(np.where(solid, ys, -1), axis=1)
+        landing = np.zeros_like(highest)
+        landing[:, 1:] = highest[:, :-1] + 1
+        fall = ys - landing
+
+        moves = {}
+        for i, y in zip(*np.nonzero(stands[1:-1])):
+            i, y = int(i) + 1, int(y)
+            x = xs[i]
+            m = []
+            for d in (-1, 1):
+                n = i + d
+                if fits[n, y] and fall[n, y] <= self.max_fall:
+                    m.append((x + d, int(landing[n, y]), WALK_COST + FALL_COST * int(fall[n, y])))
+                # room above the head for the jump
+                for j in range(1, self.jump_height + 1):
+                    if y + h + j > HEIGHT or solid[i, y + h + j - 1]:
+                        break
+                    if y + j < HEIGHT and stands[n, y + j]:
+                        m.append((x + d, y + j, JUMP_COST))
+                        break
+            moves[x, y] = m
+        return moves
+
+    def moves(self, cell: pos) -> List[Tuple[int, int, float]]:
+        """The cells an object standing in `cell` can move to, with their costs. Empty if it can't stand there."""
+        return self._region(cell[0] // self.region_size).get(cell, [])
+
+    def standing_cell(self, x: int, y: int) -> pos:
+        """The cell the feet of an object at (x, y) end up in when it falls down."""
+        if x not in self.world._blocks:
+            return x, y
+        solid = self.world.solid_column(x)
+        y = min(max(y, 1), HEIGHT - 1)
+        # out of blocks it is stuck in, then down to the ground
+        while y < HEIGHT - 1 and solid[y]:
+            y += 1
+        while y > 1 and not solid[y - 1]:
+            y -= 1
+        return x, y
+
+    def request(self, start: pos, goal: pos, callback: Optional[Callable[[PathRequest], None]] = None) -> PathRequest:
+        """Queues a search, answered from the results of earlier searches if the blocks didn't change since."""
+        start, goal = self.standing_cell(*start), self.standing_cell(*goal)
+        cached = self._results.get((start, goal))
+        if cached is not None:
+            req = PathRequest(start, goal, callback)
+            req.done, req.path, req.partial, req.expanded = True, cached.path, cached.partial, 0
+            if callback is not None:
+                callback(req)
+            return req
+        req = PathRequest(start, goal, callback)
+        self._queue.append(req)
+        return req
+
+    def find(self, start: pos, goal: pos) -> Optional[List[pos]]:
+        """Searches right away, without a time budget."""
+        req = self.request(start, goal)
+        while not req.done:
+            self._search(req, self.max_nodes)
+        if req in self._queue:
+            self._queue.remove(req)
+        return req.path
+
+    def _search(self, req: PathRequest, n: int) -> int:
+        """Takes up to `n` nodes off the open set of `req`, returns how many it took."""
+        goal = req.goal
+        gx = goal[0]
+        open_, cost, came_from = req._open, req._cost, req._came_from
+        closest = abs(req._closest[0] - gx) + abs(req._closest[1] - goal[1])
+        popped = 0
+        for _ in range(n):
+            if not open_ or req.expanded >= self.max_nodes:
+                req._finish(False)
+                break
+            _, g, node = heapq.heappop(open_)
+            popped += 1
+            if g > cost[node]:
+                continue
+            if node == goal:
+                req._finish(True)
+                break
+            req.expanded += 1
+            span = req.span
+            if node[0] < span[0]:
+                span[0] = node[0]
+            elif node[0] > span[1]:
+                span[1] = node[0]
+            d = abs(node[0] - gx) + abs(node[1] - goal[1])
+            if d < closest:
+                closest, req._closest = d, node
+            for nx, ny, c in self.moves(node):
+                ng = g + c
+                if ng < cost.get((nx, ny), float("inf")):
+                    cost[nx, ny] = ng
+                    came_from[nx, ny] = node
+                    # every move goes one column sideways and costs at least 1
+                    heapq.heappush(open_, (ng + abs(nx - gx), ng, (nx, ny)))
+        if req.done:
+            self.searches += 1
+            self._results[req.start, goal] = req
+        return popped
+
+    def update(self):
+        """Advances the queued searches, a `chunk` of nodes at a time, until `budget` is used up."""
+        budget = self.budget
+        queue = self._queue
+        while queue and budget > 0:
+            req = queue.popleft()
+            if req.cancelled:
+                continue
+            budget -= self._search(req, min(self.chunk, budget))
+            if not req.done:
+                queue.append(req)
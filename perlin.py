@@ -0,0 +1,66 @@
+import numpy as np
+
+
+def _fade(t):
+    return t * t * t * (t * (t * 6 - 15) + 10)
+
+
+class Noise:
+    """Seeded gradient (perlin) noise evaluated on whole numpy arrays at once. Values are roughly in [-1, 1]."""
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        # numpy only takes non-negative seeds, any integer is a valid configuration
+        rng = np.random.default_rng(seed % 2 ** 64)
+        p = rng.permutation(256)
+        self._perm = np.concatenate([p, p])
+        self._gradients1 = rng.uniform(-1, 1, 256)
+        angles = rng.uniform(0, 2 * np.pi, 256)
+        self._gradients2 = np.stack([np.cos(angles), np.sin(angles)], -1)
+
+    def noise1(self, x) -> np.ndarray:
+        x = np.asarray(x, float)
+        x0 = np.floor(x)
+        t = x - x0
+        i = x0.astype(np.int64) & 255
+        n0 = self._gradients1[self._perm[i]] * t
+        n1 = self._gradients1[self._perm[i + 1]] * (t - 1)
+        return (n0 + _fade(t) * (n1 - n0)) * 2
+
+    def noise2(self, x, y) -> np.ndarray:
+        x, y = np.broadcast_arrays(np.asarray(x, float), np.asarray(y, float))
+        x0, y0 = np.floor(x), np.floor(y)
+        tx, ty = x - x0, y - y0
+        i, j = x0.astype(np.int64) & 255, y0.astype(np.int64) & 255
+
+        def corner(di, dj):
+            g = self._gradients2[self._perm[self._perm[i + di] + j + dj]]
+            return g[..., 0] * (tx - di) + g[..., 1] * (ty - dj)
+
+        u, v = _fade(tx), _fade(ty)
+        a = corner(0, 0) + u * (corner(1, 0) - corner(0, 0))
+        b = corner(0, 1) + u * (corner(1, 1) - corner(0, 1))
+        return (a + v * (b - a)) * 1.4
+
+    def fractal1(self, x, octaves=1, persistence=0.5, lacunarity=2.0) -> np.ndarray:
+        x = np.asarray(x, float)
+        total = np.zeros_like(x)
+        amplitude, frequency, norm = 1.0, 1.0, 0.0
+        for o in range(octaves):
+            # every octave gets its own offset so they don't all cross zero at the same points
+            total += self.noise1(x * frequency + o * 31.7) * amplitude
+            norm += amplitude
+            amplitude *= persistence
+            frequency *= lacunarity
+        return total / norm
+
+    def fractal2(self, x, y, octaves=1, persistence=0.5, lacunarity=2.0) -> np.ndarray:
+        x, y = np.broadcast_arrays(np.asarray(x, float), np.asarray(y, float))
+        total = np.zeros_like(x)
+        amplitude, frequency, norm = 1.0, 1.0, 0.0
+        for o in range(octaves):
+            total += self.noise2(x * frequency + o * 31.7, y * frequency + o * 17.3) * amplitude
+            norm += amplitude
+            amplitude *= persistence
+            frequency *= lacunarity
+        return total / norm
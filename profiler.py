@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+from collections import deque, defaultdict
+from functools import wraps
+from typing import Dict, Deque, Optional, Tuple
+
+import numpy as np
+import pygame
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler:
+    """Collects the durations of named spans while `enabled`.
+
+    The last `window` durations of every name are kept for percentiles, with `trace` set all spans are also kept
+    (up to `trace_limit`) for `export_chrome_trace`. While disabled a span only costs the `enabled` check."""
+
+    def __init__(self, window: int = 300, trace_limit: int = 200000):
+        self.enabled = False
+        self.window = window
+        self.trace_limit = trace_limit
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=self.window))
+        self._trace: Optional[Deque[Tuple[str, float, float, int]]] = None
+        self._origin = time.perf_counter()
+
+    @property
+    def trace(self) -> bool:
+        return self._trace is not None
+
+    @trace.setter
+    def trace(self, value: bool):
+        if value and self._trace is None:
+            self._trace = deque(maxlen=self.trace_limit)
+        elif not value:
+            self._trace = None
+
+    def span(self, name: str):
+        """`with profiler.span("name"):` times the block."""
+        if not self.enabled:
+            return _null_span
+        return _Span(self, name)
+
+    def timed(self, name: str = None):
+        """Decorator timing every call of the function as a span, named after the function by default."""
+
+        def decorator(f):
+            n = name or f.__qualname__
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    self.record(n, start, time.perf_counter() - start)
+
+            return wrapper
+
+        return decorator
+
+    def record(self, name: str, start: float, duration: float):
+        self._samples[name].append(duration)
+        if self._trace is not None:
+            self._trace.append((name, start, duration, threading.get_ident()))
+
+    def clear(self):
+        self._samples.clear()
+        if self._trace is not None:
+            self._trace.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, mean, median, 90th and 99th percentile and maximum of every span in ms, over the window."""
+        result = {}
+        for name, samples in list(self._samples.items()):
+            if not samples:
+                continue
+            a = np.array(samples) * 1000
+            p50, p90, p99 = np.percentile(a, (50, 90, 99))
+            result[name] = {"count": len(a), "mean": float(a.mean()), "p50": float(p50), "p90": float(p90),
+                            "p99": float(p99), "max": float(a.max())}
+        return result
+
+    def export_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def export_chrome_trace(self, path: str):
+        """Writes the traced spans in the Chrome trace event format (chrome://tracing, Perfetto)."""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "ts": (start - self._origin) * 1e6, "dur": duration * 1e6,
+                   "pid": pid, "tid": tid} for name, start, duration, tid in (self._trace or ())]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+profiler = Profiler()
+
+
+class Overlay:
+    """Draws the profiler summary in the top left corner of the screen."""
+
+    def __init__(self, profiler: Profiler = profiler, size: int = 16, interval: float = 0.5):
+        self.profiler = profiler
+        self.size = size
+        self.interval = interval
+        self._font = None
+        self._lines = []
+        self._updated = 0.0
+
+    def _render(self):
+        if self._font is None:
+            pygame.font.init()
+            self._font = pygame.font.Font(None, self.size)
+        text = ["span                       p50     p90     p99 ms"]
+        for name, s in sorted(self.profiler.summary().items()):
+            text.append(f"{name[:24]:<24} {s['p50']:7.2f} {s['p90']:7.2f} {s['p99']:7.2f}")
+        self._lines = [self._font.render(t, True, (255, 255, 255), (0, 0, 0)) for t in text]
+
+    def draw(self, screen: pygame.Surface):
+        now = time.perf_counter()
+        if now - self._updated > self.interval:
+            self._render()
+            self._updated = now
+        y = 0
+        for line in self._lines:
+            screen.blit(line, (0, y))
+            y += line.get_height()
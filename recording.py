@@ -0,0 +1,128 @@
+import gzip
+import json
+import zlib
+from typing import Dict, List, Tuple, Any
+
+import pygame
+
+from control_handler import Input
+
+VERSION = 1
+
+
+def checksum(world) -> int:
+    """CRC32 of the loaded columns and the positions and velocities of the objects of `world`."""
+    crc = 0
+    for x in sorted(world._blocks):
+        crc = zlib.crc32(x.to_bytes(8, "little", signed=True), crc)
+        crc = zlib.crc32(world._blocks[x].tobytes(), crc)
+    e = world.entities
+    slots = e.slots()
+    crc = zlib.crc32(e.pos[slots].tobytes(), crc)
+    return zlib.crc32(e.velocity[slots].tobytes(), crc)
+
+
+class Recording:
+    """The input of a session, as `ScriptedInput` actions, with everything needed to run it again: the modpack
+    (which has the generator seed), the scene resolution the controllers see and `checksums`, [tick, checksum of
+    the world after that many ticks] every `interval` ticks and at the end. Stored as gzipped json."""
+
+    def __init__(self, modpack: Dict[str, Any], resolution: Tuple[int, int], interval: int = 60):
+        self.modpack = modpack
+        self.resolution = tuple(resolution)
+        self.interval = interval
+        self.ticks = 0
+        self.actions: List[Dict[str, Any]] = []
+        self.checksums: List[List[int]] = []
+
+    def save(self, path: str):
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump({"version": VERSION, "modpack": self.modpack, "resolution": self.resolution,
+                       "interval": self.interval, "ticks": self.ticks, "actions": self.actions,
+                       "checksums": self.checksums}, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != VERSION:
+            raise ValueError(f"{path} is a recording of version {data.get('version')}, not {VERSION}")
+        recording = cls(data["modpack"], data["resolution"], data["interval"])
+        recording.ticks = data["ticks"]
+        recording.actions = data["actions"]
+        recording.checksums = data["checksums"]
+        return recording
+
+
+class RecordingInput(Input):
+    """Passes the state of `input` to the controllers of `scene` and records what they saw into `recording`.
+
+    Pressed keys and the mouse position are recorded when a controller reads them and they changed since,
+    the key events the scene handles are recorded as they come in. Actions get the number of ticks the world ran
+    so far as tick, which is the tick `HeadlessScene.step` replays them at."""
+
+    def __init__(self, scene, input: Input):
+        self.scene = scene
+        self.input = input
+        modpack = {k: v for k, v in scene.modpack.items() if k != "record"}
+        self.recording = Recording(modpack, scene.resolution)
+        self._pressed = set()
+        self._mouse = None
+
+    @property
+    def tick(self) -> int:
+        return self.scene.world.ticks.tick
+
+    def _record(self, merge: bool = False, **action):
+        """Appends an action, with `merge` it replaces the last one instead if that is of the same kind and tick."""
+        actions = self.recording.actions
+        if merge and actions and actions[-1]["tick"] == self.tick and actions[-1].keys() == action.keys() | {"tick"}:
+            actions[-1].update(action)
+        else:
+            actions.append({"tick": self.tick, **action})
+
+    def is_pressed(self, key: int) -> bool:
+        pressed = bool(self.input.is_pressed(key))
+        if pressed != (key in self._pressed):
+            self._pressed ^= {key}
+            self._record(True, pressed=sorted(self._pressed))
+        return pressed
+
+    def mouse_pos(self) -> Tuple[int, int]:
+        pos = tuple(self.input.mouse_pos())
+        if pos != self._mouse:
+            self._mouse = pos
+            self._record(True, mouse=list(pos))
+        return pos
+
+    def advance(self, tick: int) -> List[pygame.event.EventType]:
+        return self.input.advance(tick)
+
+    def event(self, event: pygame.event.EventType):
+        """Records a key event handled by the scene, repeats within a tick are counted."""
+        kind = {pygame.KEYDOWN: "keydown", pygame.KEYUP: "keyup"}.get(event.type)
+        if kind is None:
+            return
+        actions = self.recording.actions
+        last = actions[-1] if actions else {}
+        if last.get("tick") == self.tick and last.get(kind) == event.key:
+            last["count"] = last.get("count", 1) + 1
+        else:
+            self._record(**{kind: event.key})
+
+    def checkpoint(self):
+        """Records the world checksum every `interval` ticks, called after each tick."""
+        tick = self.tick
+        if tick and tick % self.recording.interval == 0:
+            self.recording.checksums.append([tick, checksum(self.scene.world)])
+
+    def save(self, path: str):
+        """Ends the recording with the checksum of the world now and writes it to `path`."""
+        recording = self.recording
+        recording.ticks = tick = self.tick
+        actions = recording.actions
+        # events after the last tick changed the world already, a replay stops before them
+        done = recording.checksums and recording.checksums[-1][0] == tick
+        if not done and (not actions or actions[-1]["tick"] < tick):
+            recording.checksums.append([tick, checksum(self.scene.world)])
+        recording.save(path)
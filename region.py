@@ -0,0 +1,118 @@
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+
+from block import Block
+from palette import Palette
+
+REGION_SIZE = 32
+MAGIC = b"PCRG"
+_header = struct.Struct("<4sH")
+_entry = struct.Struct("<II")
+_TABLE_SIZE = _header.size + _entry.size * REGION_SIZE
+
+
+def encode_column(palette: Palette, array: np.ndarray) -> bytes:
+    """Serializes a column independent of the palette: the states used by the column are stored by id and data."""
+    used, local = np.unique(array, return_inverse=True)
+    states = json.dumps([(palette[i].id, dict(palette[i].data)) for i in used]).encode()
+    dtype = np.uint8 if len(used) <= 256 else np.uint16
+    return zlib.compress(struct.pack("<I", len(states)) + states + local.astype(dtype).tobytes())
+
+
+def decode_column(palette: Palette, data: bytes) -> np.ndarray:
+    data = zlib.decompress(data)
+    n, = struct.unpack_from("<I", data)
+    states = json.loads(data[4:4 + n].decode())
+    dtype = np.uint8 if len(states) <= 256 else np.uint16
+    local = np.frombuffer(data, dtype, offset=4 + n)
+    lookup = np.array([palette.index(Block.by_id(i), d) for i, d in states], palette.dtype)
+    return lookup[local]
+
+
+class RegionFile:
+    """A file holding REGION_SIZE compressed columns, found through an offset table at the start of the file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(_header.pack(MAGIC, REGION_SIZE) + bytes(_entry.size * REGION_SIZE))
+        self._file = open(path, "r+b")
+        magic, size = _header.unpack(self._file.read(_header.size))
+        if magic != MAGIC or size != REGION_SIZE:
+            raise ValueError(f"'{path}' is not a region file")
+        self._table = [_entry.unpack(self._file.read(_entry.size)) for _ in range(REGION_SIZE)]
+        self._map: mmap.mmap = None
+
+    def __contains__(self, item: int):
+        return self._table[item][1] > 0
+
+    def read(self, item: int) -> Optional[bytes]:
+        offset, length = self._table[item]
+        if not length:
+            return None
+        if self._map is None:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map[offset:offset + length]
+
+    def write(self, item: int, data: bytes):
+        offset, length = self._table[item]
+        if len(data) > length:
+            # doesn't fit into the old slot, append to the end of the file
+            offset = self._file.seek(0, os.SEEK_END)
+        else:
+            self._file.seek(offset)
+        self._file.write(data)
+        self._table[item] = offset, len(data)
+        self._file.seek(_header.size + _entry.size * item)
+        self._file.write(_entry.pack(offset, len(data)))
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class RegionStorage:
+    """All region files of one world."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._regions: Dict[int, RegionFile] = {}
+
+    def _region(self, x: int, create=False) -> Optional[RegionFile]:
+        r = x // REGION_SIZE
+        if r not in self._regions:
+            path = os.path.join(self.directory, f"r.{r}.region")
+            if not create and not os.path.exists(path):
+                return None
+            self._regions[r] = RegionFile(path)
+        return self._regions[r]
+
+    def __contains__(self, x: int):
+        region = self._region(x)
+        return region is not None and x % REGION_SIZE in region
+
+    def load(self, x: int, palette: Palette) -> Optional[np.ndarray]:
+        region = self._region(x)
+        data = region.read(x % REGION_SIZE) if region is not None else None
+        return decode_column(palette, data) if data is not None else None
+
+    def save(self, x: int, palette: Palette, array: np.ndarray):
+        self._region(x, True).write(x % REGION_SIZE, encode_column(palette, array))
+
+    def close(self):
+        for region in self._regions.values():
+            region.close()
+        self._regions = {}
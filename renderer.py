@@ -0,0 +1,84 @@
+from typing import Tuple
+
+import pygame
+
+from CONFIGURATION import SCALE, HEIGHT
+from light import MAX_LIGHT
+from util import LimitedSizeDict
+
+TILE_SIZE = 16
+
+pos = Tuple[int, int]
+
+
+class TileRenderer:
+    """Renders the terrain of a world in tiles of TILE_SIZE x TILE_SIZE blocks.
+
+    Tiles are kept until a block inside them changes, so drawing a view only blits the few tiles it overlaps.
+    Once the tiles take more than `budget` bytes, the least recently used ones are dropped."""
+
+    def __init__(self, world, budget: int = 32 * 2 ** 20):
+        self.world = world
+        self.budget = budget
+        # all tiles are RGBA surfaces of the same size
+        tile_bytes = 4 * (TILE_SIZE * SCALE) ** 2
+        self._tiles: LimitedSizeDict = LimitedSizeDict(size_limit=max(budget // tile_bytes, 1))
+        self._view: pygame.Surface = None
+        self._shades = []
+        for level in range(MAX_LIGHT + 1):
+            shade = pygame.Surface((SCALE, SCALE), pygame.SRCALPHA)
+            shade.fill((0, 0, 0, round(255 * (1 - 0.8 ** (MAX_LIGHT - level)))))
+            self._shades.append(shade)
+
+    def invalidate(self, block: pos):
+        self._tiles.pop((block[0] // TILE_SIZE, block[1] // TILE_SIZE), None)
+
+    def invalidate_column(self, x: int):
+        for ty in range(HEIGHT // TILE_SIZE):
+            self._tiles.pop((x // TILE_SIZE, ty), None)
+
+    @property
+    def size(self) -> int:
+        return sum(t.get_bytesize() * t.get_width() * t.get_height() for t in self._tiles.values())
+
+    def clear(self):
+        self._tiles.clear()
+
+    def _render_tile(self, tx: int, ty: int) -> pygame.Surface:
+        sur = pygame.Surface((TILE_SIZE * SCALE, TILE_SIZE * SCALE), pygame.SRCALPHA)
+        sur.fill((0, 0, 0, 0))
+        # load the columns (and their light) first, loading changes the light of the neighbours
+        columns = [self.world.get_column(x) for x in range(tx * TILE_SIZE - 1, tx * TILE_SIZE + TILE_SIZE + 1)][1:-1]
+        light = self.world.light
+        for lx, column in enumerate(columns):
+            for ly in range(TILE_SIZE):
+                y = ty * TILE_SIZE + ly
+                b = column[y]
+                xo, yo = b.draw_offset
+                p = (lx * SCALE - xo, (TILE_SIZE - 1 - ly) * SCALE - yo)
+                sur.blit(b.image, p)
+                level = light.level(tx * TILE_SIZE + lx, y)
+                if level < MAX_LIGHT:
+                    sur.blit(self._shades[level], p)
+        return sur
+
+    def tile(self, tx: int, ty: int) -> pygame.Surface:
+        key = (tx, ty)
+        if key in self._tiles:
+            self._tiles.move_to_end(key)
+        else:
+            self._tiles[key] = self._render_tile(tx, ty)
+        return self._tiles[key]
+
+    def render(self, x_range: pos, y_range: pos) -> pygame.Surface:
+        """The blocks in the range, block y is drawn with its top at `height - (y - y_range[0]) * SCALE`."""
+        size = ((x_range[1] - x_range[0]) * SCALE, (y_range[1] - y_range[0]) * SCALE)
+        if self._view is None or self._view.get_size() != size:
+            self._view = pygame.Surface(size, pygame.SRCALPHA)
+        self._view.fill((0, 0, 0, 0))
+        for tx in range(x_range[0] // TILE_SIZE, (x_range[1] - 1) // TILE_SIZE + 1):
+            for ty in range(max(y_range[0], 0) // TILE_SIZE, min(y_range[1], HEIGHT - 1) // TILE_SIZE + 1):
+                top = ty * TILE_SIZE + TILE_SIZE - 1
+                self._view.blit(self.tile(tx, ty), ((tx * TILE_SIZE - x_range[0]) * SCALE,
+                                                    size[1] - (top - y_range[0]) * SCALE))
+        return self._view
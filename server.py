@@ -0,0 +1,458 @@
+import argparse
+import asyncio
+import json
+import struct
+import time
+import zlib
+from typing import Dict, List, Set, Tuple, Any, Optional
+
+import numpy as np
+import pygame
+
+from CONFIGURATION import HEIGHT
+from block import Block
+from control_handler import ControlHandler, Input
+from manifest import loader
+from object import Object
+from palette import Palette
+from region import encode_column, decode_column
+from util import get_mod_item, Rect
+from world import World, BlockChange
+from world_scene import create_world
+
+# every message is a frame of: payload length, message type, payload
+FRAME = struct.Struct("<IB")
+
+HELLO = 0  # client -> server: json {"name": ...}
+WELCOME = 1  # server -> client: player entity id, tick rate
+INPUT = 2  # client -> server: INPUT_ACTION
+COLUMN = 3  # server -> client: x, encoded column, sent when the column comes into the interest radius
+UNLOAD = 4  # server -> client: xs
+SPAWN = 5  # server -> client: entity id, size, object id
+MOVE = 6  # server -> client: tick, (entity id, x, y) for every entity that moved
+DESPAWN = 7  # server -> client: entity ids
+BLOCKS = 8  # server -> client: zlib of the states used, (x, y, index of the state) for every changed cell
+
+PRESS, RELEASE, MOUSE = 0, 1, 2
+INPUT_ACTION = struct.Struct("<BIhh")
+WELCOME_DATA = struct.Struct("<If")
+COLUMN_HEADER = struct.Struct("<i")
+SPAWN_HEADER = struct.Struct("<Iff")
+MOVE_HEADER = struct.Struct("<I")
+MOVE_ENTRY = struct.Struct("<Iff")
+BLOCK_ENTRY = struct.Struct("<iHH")
+ID = struct.Struct("<I")
+# no message is close to this, a bigger length means the stream is broken
+MAX_PAYLOAD = 2 ** 24
+
+
+class ProtocolError(ValueError):
+    """A message that doesn't follow the protocol, the connection is closed."""
+
+
+def frame(kind: int, payload: bytes = b"") -> bytes:
+    return FRAME.pack(len(payload), kind) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+    n, kind = FRAME.unpack(await reader.readexactly(FRAME.size))
+    if n > MAX_PAYLOAD:
+        raise ProtocolError(f"message of {n} bytes")
+    return kind, await reader.readexactly(n)
+
+
+def unpack_all(entry: struct.Struct, payload: bytes, offset: int = 0) -> List[tuple]:
+    """The entries packed back to back in the payload from `offset` on."""
+    if len(payload) < offset or (len(payload) - offset) % entry.size:
+        raise ProtocolError(f"{len(payload)} bytes aren't entries of {entry.size} bytes after {offset}")
+    return list(entry.iter_unpack(payload[offset:]))
+
+
+def parse_hello(payload: bytes) -> str:
+    """The name in a HELLO message."""
+    try:
+        hello = json.loads(payload.decode())
+    except ValueError as e:
+        raise ProtocolError(f"bad HELLO: {e}") from None
+    if not isinstance(hello, dict) or not isinstance(hello.get("name", ""), str):
+        raise ProtocolError("bad HELLO: not an object with a name")
+    return hello.get("name", "")
+
+
+def encode_blocks(palette: Palette, xs: List[int], ys: List[int], states: List[int]) -> bytes:
+    """The cells (xs[i], ys[i]) set to the palette states, independent of the palette like `encode_column`."""
+    used, local = np.unique(np.asarray(states, np.int64), return_inverse=True)
+    names = json.dumps([(palette[i].id, dict(palette[i].data)) for i in used.tolist()]).encode()
+    cells = b"".join(BLOCK_ENTRY.pack(x, y, i) for x, y, i in zip(xs, ys, local.tolist()))
+    return zlib.compress(struct.pack("<I", len(names)) + names + cells)
+
+
+def decode_blocks(palette: Palette, payload: bytes) -> List[Tuple[int, int, int]]:
+    """(x, y, state in `palette`) of the cells of a BLOCKS message."""
+    data = zlib.decompress(payload)
+    n, = struct.unpack_from("<I", data)
+    states = json.loads(data[4:4 + n].decode())
+    lookup = [palette.index(Block.by_id(i), d) for i, d in states]
+    cells = []
+    for x, y, i in unpack_all(BLOCK_ENTRY, data, 4 + n):
+        if y >= HEIGHT or i >= len(lookup):
+            raise ProtocolError(f"bad cell {x}, {y} with state {i}")
+        cells.append((x, y, lookup[i]))
+    return cells
+
+
+class RemoteInput(Input):
+    """Input state of a client, changed by its INPUT messages."""
+
+    def __init__(self):
+        self.pressed: Set[int] = set()
+        self.mouse = (0, 0)
+        self.events: List[pygame.event.EventType] = []
+
+    def apply(self, payload: bytes):
+        if len(payload) != INPUT_ACTION.size:
+            raise ProtocolError(f"INPUT of {len(payload)} bytes")
+        action, key, x, y = INPUT_ACTION.unpack(payload)
+        if action == PRESS:
+            self.pressed.add(key)
+            self.events.append(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+        elif action == RELEASE:
+            self.pressed.discard(key)
+            self.events.append(pygame.event.Event(pygame.KEYUP, key=key, mod=0, unicode="", scancode=0))
+        elif action == MOUSE:
+            self.mouse = (x, y)
+        else:
+            raise ProtocolError(f"unknown input action {action}")
+
+    def is_pressed(self, key: int) -> bool:
+        return key in self.pressed
+
+    def mouse_pos(self) -> Tuple[int, int]:
+        return self.mouse
+
+
+class Session:
+    """A connected client: its player, the controllers driving it and what the client was sent so far.
+
+    The session is the scene of its controllers, they see the same attributes as in a `PlayScene`."""
+
+    def __init__(self, server: "Server", writer: asyncio.StreamWriter, name: str):
+        self.server = server
+        self.writer = writer
+        self.name = name
+        self.world = server.world
+        self.resolution = (640, 480)
+        self.scroll = [0, 0]
+        self.input = RemoteInput()
+        self.player: Object = get_mod_item(server.mods, server.modpack["player"][0])((0, 0))
+        self.player.pos = server.modpack["player"][1]
+        self.controller: List[ControlHandler] = [get_mod_item(server.mods, c)(self) for c in server.modpack["controller"]]
+        self.columns: Set[int] = set()
+        # changed cells of the columns the client has, {x: ys}
+        self.dirty: Dict[int, Set[int]] = {}
+        self.entities: Dict[int, Tuple[float, float]] = {}
+
+    def send(self, kind: int, payload: bytes = b""):
+        self.writer.write(frame(kind, payload))
+
+    @property
+    def congested(self) -> bool:
+        return self.writer.transport.get_write_buffer_size() > self.server.write_buffer_limit
+
+    def tick(self, dt: float):
+        events, self.input.events = self.input.events, []
+        for event in events:
+            for con in self.controller:
+                con.handle(event)
+        for con in self.controller:
+            con.update(dt)
+
+    def sync(self, tick: int):
+        """Sends the columns new to the client, the changed cells of those it has and the entity changes within
+        the interest radius around the player."""
+        server, world = self.server, self.world
+        c = int(self.player.pos.x)
+        radius = server.interest_radius
+        wanted = range(c - radius, c + radius + 1)
+        gone = [x for x in self.columns if abs(x - c) > radius + server.unload_margin]
+        if gone:
+            self.columns.difference_update(gone)
+            for x in gone:
+                self.dirty.pop(x, None)
+            self.send(UNLOAD, struct.pack(f"<{len(gone)}i", *gone))
+        if not self.congested:
+            if self.dirty:
+                # the current states, a cell that changed several times since is sent once
+                xs = [x for x, ys in self.dirty.items() for _ in ys]
+                ys = [y for ys in self.dirty.values() for y in ys]
+                blocks = world._blocks
+                states = [int(blocks[x][y]) for x, y in zip(xs, ys)]
+                self.send(BLOCKS, encode_blocks(world.palette, xs, ys, states))
+                self.dirty = {}
+            budget = server.columns_per_tick
+            for x in sorted((x for x in wanted if x not in self.columns), key=lambda x: abs(x - c)):
+                if budget <= 0:
+                    break
+                if not world.is_ready(x):
+                    continue
+                self.send(COLUMN, COLUMN_HEADER.pack(x) + server.encoded(x))
+                self.columns.add(x)
+                budget -= 1
+
+        e = world.entities
+        view = Rect(c - radius, 0, radius * 2 + 1, HEIGHT)
+        visible = {}
+        for slot in world.spatial.query(view):
+            obj = e.objects[slot]
+            if obj is not None and view.x <= e.pos[slot, 0] <= view.right:
+                visible[server.entity_id(obj)] = slot
+        gone = [i for i in self.entities if i not in visible]
+        if gone:
+            for i in gone:
+                del self.entities[i]
+            self.send(DESPAWN, struct.pack(f"<{len(gone)}I", *gone))
+        moves = []
+        for i, slot in visible.items():
+            p = (float(e.pos[slot, 0]), float(e.pos[slot, 1]))
+            old = self.entities.get(i)
+            if old is None:
+                name = e.objects[slot].id.encode()
+                self.send(SPAWN, SPAWN_HEADER.pack(i, *e.size[slot].tolist()) + name)
+            elif abs(old[0] - p[0]) < server.move_threshold and abs(old[1] - p[1]) < server.move_threshold:
+                continue
+            self.entities[i] = p
+            moves.append(MOVE_ENTRY.pack(i, *p))
+        if moves:
+            self.send(MOVE, MOVE_HEADER.pack(tick) + b"".join(moves))
+
+
+class Server:
+    """Runs a world at its tick rate and keeps the connected clients in sync with it.
+
+    Clients only get the columns and entities within `interest_radius` columns of their player: columns once,
+    then only the cells that changed, entities when they appear or moved more than `move_threshold`. So the work and
+    bandwidth per client don't depend on the size of the world."""
+
+    def __init__(self, modpack: Dict[str, Any], interest_radius: int = 48, unload_margin: int = 8,
+                 columns_per_tick: int = 8, move_threshold: float = 1 / 64, write_buffer_limit: int = 2 ** 20):
+        self.modpack = modpack
+        self.mods = loader.load(modpack["mods"])
+        self.world: World = create_world(modpack, self.mods)
+        self.interest_radius = interest_radius
+        self.unload_margin = unload_margin
+        self.columns_per_tick = columns_per_tick
+        self.move_threshold = move_threshold
+        self.write_buffer_limit = write_buffer_limit
+        self.sessions: List[Session] = []
+        self.tick = 0
+        self._ids: Dict[Object, int] = {}
+        self._next_id = 1
+        self._encoded: Dict[int, bytes] = {}
+        self._servers: List[asyncio.AbstractServer] = []
+        self._handlers: Set[asyncio.Task] = set()
+        self.world.subscribe(self._changed)
+
+    def entity_id(self, obj: Object) -> int:
+        i = self._ids.get(obj)
+        if i is None:
+            i = self._ids[obj] = self._next_id
+            self._next_id += 1
+        return i
+
+    def encoded(self, x: int) -> bytes:
+        """The encoded column x, shared between the clients until it changes."""
+        data = self._encoded.get(x)
+        if data is None:
+            data = self._encoded[x] = encode_column(self.world.palette, self.world.get_column(x).array)
+        return data
+
+    def _changed(self, changes: List[BlockChange]):
+        for x in {c.pos[0] for c in changes}:
+            self._encoded.pop(x, None)
+        for s in self.sessions:
+            for c in changes:
+                x, y = c.pos
+                if x in s.columns:
+                    s.dirty.setdefault(x, set()).add(y)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        session = None
+        self._handlers.add(asyncio.current_task())
+        try:
+            kind, payload = await read_frame(reader)
+            if kind != HELLO:
+                return
+            session = Session(self, writer, parse_hello(payload))
+            self.world.track(session.player)
+            self.sessions.append(session)
+            session.send(WELCOME, WELCOME_DATA.pack(self.entity_id(session.player), self.world.tick_rate))
+            while True:
+                kind, payload = await read_frame(reader)
+                if kind != INPUT:
+                    raise ProtocolError(f"unexpected message {kind}")
+                session.input.apply(payload)
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError):
+            pass
+        finally:
+            if session is not None:
+                self.sessions.remove(session)
+                self.world.remove(session.player)
+                self._ids.pop(session.player, None)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def step(self):
+        tl = self.world.tick_length
+        for s in self.sessions:
+            s.tick(tl)
+        self.world.update(tl)
+        loaded = self.world.loaded_columns()
+        for x in [x for x in self._encoded if x not in loaded]:
+            del self._encoded[x]
+        for s in self.sessions:
+            s.sync(self.tick)
+        self.tick += 1
+
+    async def listen(self, host: str = "127.0.0.1", port: int = 25575, path: str = None):
+        if path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._client, path))
+        else:
+            self._servers.append(await asyncio.start_server(self._client, host, port))
+
+    async def run(self, ticks: Optional[int] = None):
+        """Steps the world at its tick rate, forever or for `ticks` ticks."""
+        tl = self.world.tick_length
+        next_tick = time.perf_counter()
+        while ticks is None or self.tick < ticks:
+            behind = 0
+            while time.perf_counter() >= next_tick and behind < self.world.max_ticks_per_frame:
+                self.step()
+                next_tick += tl
+                behind += 1
+            if behind == self.world.max_ticks_per_frame:
+                # too slow, drop the ticks instead of catching up forever
+                next_tick = time.perf_counter() + tl
+            await asyncio.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    async def close(self):
+        for s in self._servers:
+            s.close()
+        for session in self.sessions:
+            # the handlers see the end of the stream and clean up
+            session.writer.close()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        self.world.close()
+
+
+class Client:
+    """Minimal client: sends input, keeps the received columns (in its own palette) and entity positions."""
+
+    def __init__(self):
+        self.palette = Palette()
+        self.columns: Dict[int, np.ndarray] = {}
+        self.entities: Dict[int, Tuple[float, float]] = {}
+        self.types: Dict[int, str] = {}
+        self.player_id = None
+        self.tick_rate = None
+        self.received = 0
+        self._reader: asyncio.StreamReader = None
+        self._writer: asyncio.StreamWriter = None
+
+    async def connect(self, host: str = "127.0.0.1", port: int = 25575, path: str = None, name: str = ""):
+        if path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._writer.write(frame(HELLO, json.dumps({"name": name}).encode()))
+        kind, payload = await read_frame(self._reader)
+        if kind != WELCOME or len(payload) != WELCOME_DATA.size:
+            self.close()
+            raise ProtocolError(f"expected WELCOME, got message {kind}")
+        self.player_id, self.tick_rate = WELCOME_DATA.unpack(payload)
+
+    def press(self, key: int):
+        self._writer.write(frame(INPUT, INPUT_ACTION.pack(PRESS, key, 0, 0)))
+
+    def release(self, key: int):
+        self._writer.write(frame(INPUT, INPUT_ACTION.pack(RELEASE, key, 0, 0)))
+
+    def mouse(self, x: int, y: int):
+        self._writer.write(frame(INPUT, INPUT_ACTION.pack(MOUSE, 0, x, y)))
+
+    def _handle(self, kind: int, payload: bytes):
+        try:
+            if kind == COLUMN:
+                x, = COLUMN_HEADER.unpack_from(payload)
+                self.columns[x] = decode_column(self.palette, payload[COLUMN_HEADER.size:])
+            elif kind == BLOCKS:
+                for x, y, state in decode_blocks(self.palette, payload):
+                    column = self.columns.get(x)
+                    if column is not None:
+                        column[y] = state
+            elif kind == UNLOAD:
+                for x, in unpack_all(COLUMN_HEADER, payload):
+                    self.columns.pop(x, None)
+            elif kind == SPAWN:
+                i, w, h = SPAWN_HEADER.unpack_from(payload)
+                self.types[i] = payload[SPAWN_HEADER.size:].decode()
+            elif kind == MOVE:
+                for i, x, y in unpack_all(MOVE_ENTRY, payload, MOVE_HEADER.size):
+                    self.entities[i] = (x, y)
+            elif kind == DESPAWN:
+                for i, in unpack_all(ID, payload):
+                    self.entities.pop(i, None)
+                    self.types.pop(i, None)
+            else:
+                raise ProtocolError(f"unknown message {kind}")
+        except (struct.error, zlib.error, ValueError, LookupError) as e:
+            # ProtocolError is a ValueError as well
+            raise ProtocolError(str(e)) from None
+
+    async def receive(self, timeout: float = None):
+        """Handles the incoming messages until the connection is closed or nothing came for `timeout` seconds."""
+        try:
+            while True:
+                kind, payload = await asyncio.wait_for(read_frame(self._reader), timeout)
+                self.received += FRAME.size + len(payload)
+                self._handle(kind, payload)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except ProtocolError:
+            self.close()
+            raise
+
+    def close(self):
+        self._writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs a world for network clients.")
+    parser.add_argument("--modpack", help="json file with a modpack, defaults to the one in main.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25575)
+    parser.add_argument("--unix", help="listen on this unix socket instead of tcp")
+    parser.add_argument("--radius", type=int, default=48, help="interest radius in columns")
+    args = parser.parse_args(argv)
+    if args.modpack:
+        with open(args.modpack) as f:
+            modpack = json.load(f)
+    else:
+        from main import mod_pack
+        modpack = dict(mod_pack)
+
+    async def serve():
+        server = Server(modpack, interest_radius=args.radius)
+        await server.listen(args.host, args.port, args.unix)
+        try:
+            await server.run()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from collections import defaultdict
+from itertools import combinations
+from math import floor
+from typing import Dict, Set, Tuple
+
+import numpy as np
+
+from util import Rect
+
+cell = Tuple[int, int]
+
+
+class SpatialHash:
+    """Uniform grid of `cell_size` blocks, mapping cells to the entity slots whose box overlaps them.
+
+    `update` only touches the slots that moved into other cells, and the cells holding more than one slot are
+    tracked, so both range queries and pair finding depend on the local density instead of the object count."""
+
+    def __init__(self, cell_size: float = 4):
+        self.cell_size = cell_size
+        self._cells: Dict[cell, Set[int]] = defaultdict(set)
+        self._crowded: Set[cell] = set()
+        self._bounds = np.zeros((0, 4), int)
+        self._inserted = np.zeros(0, bool)
+
+    def _reserve(self, n: int):
+        if n > len(self._inserted):
+            bounds = np.zeros((n * 2, 4), int)
+            bounds[:len(self._bounds)] = self._bounds
+            inserted = np.zeros(n * 2, bool)
+            inserted[:len(self._inserted)] = self._inserted
+            self._bounds, self._inserted = bounds, inserted
+
+    def _cells_of(self, bounds):
+        x0, y0, x1, y1 = bounds
+        return ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    def _add(self, slot: int, bounds):
+        for c in self._cells_of(bounds):
+            s = self._cells[c]
+            s.add(slot)
+            if len(s) == 2:
+                self._crowded.add(c)
+
+    def _discard(self, slot: int, bounds):
+        for c in self._cells_of(bounds):
+            s = self._cells[c]
+            s.discard(slot)
+            if len(s) == 1:
+                self._crowded.discard(c)
+            elif not s:
+                del self._cells[c]
+
+    def update(self, slots: np.ndarray, pos: np.ndarray, size: np.ndarray):
+        """Moves the given slots to the cells of their boxes (`pos` and `size` are indexed by slot)."""
+        if not len(slots):
+            return
+        self._reserve(int(slots.max()) + 1)
+        lo = np.floor(pos[slots] / self.cell_size).astype(int)
+        hi = np.floor((pos[slots] + size[slots]) / self.cell_size).astype(int)
+        bounds = np.concatenate([lo, hi], axis=1)
+        moved = ~self._inserted[slots] | np.any(bounds != self._bounds[slots], axis=1)
+        for slot, b in zip(slots[moved].tolist(), bounds[moved].tolist()):
+            if self._inserted[slot]:
+                self._discard(slot, self._bounds[slot].tolist())
+            self._add(slot, b)
+            self._bounds[slot] = b
+            self._inserted[slot] = True
+
+    def remove(self, slot: int):
+        if slot < len(self._inserted) and self._inserted[slot]:
+            self._discard(slot, self._bounds[slot].tolist())
+            self._inserted[slot] = False
+
+    def query(self, rect: Rect) -> Set[int]:
+        """Slots in the cells overlapping `rect`, a superset of the objects actually inside it."""
+        cs = self.cell_size
+        result = set()
+        for c in self._cells_of((floor(rect.x / cs), floor(rect.y / cs),
+                                 floor(rect.right / cs), floor(rect.bottom / cs))):
+            if c in self._cells:
+                result |= self._cells[c]
+        return result
+
+    def pairs(self, mask: np.ndarray = None) -> Set[Tuple[int, int]]:
+        """Candidate pairs of slots sharing at least one cell, only slots set in `mask` if given."""
+        result = set()
+        for c in self._crowded:
+            slots = sorted(self._cells[c])
+            if mask is not None:
+                slots = [s for s in slots if mask[s]]
+            result.update(combinations(slots, 2))
+        return result
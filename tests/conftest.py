@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the engine loads assets and mods relative to the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from CONFIGURATION import HEIGHT  # noqa: E402
+from generator import Generator  # noqa: E402
+from mods.minecraft.blocks import Air, Stone  # noqa: E402
+from world import World  # noqa: E402
+
+GROUND = 10
+
+
+class Flat(Generator):
+    """Stone below y = GROUND, air above."""
+
+    def _generate_range(self, x0, x1):
+        p = self.palette
+        column = np.full(HEIGHT, p.index(Air), p.dtype)
+        column[:GROUND] = p.index(Stone)
+        for x in range(x0, x1):
+            self._terrain[x] = column.copy()
+
+
+@pytest.fixture
+def make_world():
+    """Creates worlds (of a `Flat` generator by default) with the columns x0 <= x < x1 loaded, closed after
+    the test."""
+    worlds = []
+
+    def make(generator=None, x0=-40, x1=40, **kwargs):
+        world = World(generator if generator is not None else Flat(), (0, -20), **kwargs)
+        worlds.append(world)
+        world.pregenerate(x0, x1)
+        return world
+
+    yield make
+    for world in worlds:
+        world.close()
+
+
+@pytest.fixture
+def world(make_world):
+    return make_world()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from CONFIGURATION import HEIGHT
+from collision import TileCollider
+from util import Rect
+
+
+def ground(wall=None):
+    """Solid below y = 10, and a single block thick wall at x = `wall` up to y = 20."""
+    def solid_column(x):
+        column = np.zeros(HEIGHT, bool)
+        column[:10] = True
+        if x == wall:
+            column[:20] = True
+        return column
+    return TileCollider(solid_column)
+
+
+def test_falling_box_lands_on_the_ground():
+    rect = Rect(2.5, 15, 0.5, 1.5)
+    assert ground().move(rect, (0, -3)) == (False, False)
+    assert (rect.x, rect.y) == (2.5, 12)
+    assert ground().move(rect, (0, -100)) == (False, True)
+    assert rect.y == 10
+
+
+def test_fast_box_does_not_tunnel_through_a_wall():
+    rect = Rect(0.2, 12, 0.6, 1.8)
+    assert ground(wall=5).move(rect, (50, 0)) == (True, False)
+    assert rect.right == 5
+    rect = Rect(9.2, 12, 0.6, 1.8)
+    assert ground(wall=5).move(rect, (-50, 0)) == (True, False)
+    assert rect.x == 6
+
+
+def test_box_slides_along_the_ground():
+    rect = Rect(2, 10, 1, 1)
+    assert ground().move(rect, (3.5, -0.5)) == (False, True)
+    assert (rect.x, rect.y) == (5.5, 10)
+
+
+def test_box_touching_a_wall_can_move_away():
+    rect = Rect(4, 12, 1, 1)
+    collider = ground(wall=5)
+    assert collider.move_x(rect, 0.5)
+    assert rect.x == 4
+    assert not collider.move_x(rect, -0.5)
+    assert rect.x == 3.5
+
+
+@pytest.mark.parametrize("dy", [1, 300])
+def test_box_moves_freely_above_the_world(dy):
+    rect = Rect(0, HEIGHT - 2, 1, 1)
+    assert not ground().move_y(rect, dy)
+    assert rect.y == HEIGHT - 2 + dy
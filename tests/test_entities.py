@@ -0,0 +1,24 @@
+import gc
+import weakref
+
+from mods.minecraft import Player
+
+
+def test_objects_outside_a_world_are_freed():
+    ref = weakref.ref(Player((0, 0)))
+    gc.collect()
+    assert ref() is None
+
+
+def test_removed_objects_are_freed(world):
+    player = Player((3, 12))
+    world.add(player)
+    assert len(world.entities) == 1
+    pos = tuple(player.pos)
+    world.remove(player)
+    assert len(world.entities) == 0
+    assert tuple(player.pos) == pos
+    ref = weakref.ref(player)
+    del player
+    gc.collect()
+    assert ref() is None
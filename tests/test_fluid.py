@@ -0,0 +1,58 @@
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from generator import Generator
+from mods.minecraft.blocks import Air, Stone, Water
+
+
+class Lake(Generator):
+    """A lake of full water at -3 < x < 0 between stone walls at x = -3 and x = 4, a cave at 0 <= x < 4."""
+
+    def _generate_range(self, x0, x1):
+        p = self.palette
+        for x in range(x0, x1):
+            column = np.full(HEIGHT, p.index(Air), p.dtype)
+            column[:10] = p.index(Stone)
+            if x in (-3, 4):
+                column[:20] = p.index(Stone)
+            elif x < 0:
+                column[10:14] = p.index(Water, {"level": Water.max_level})
+            else:
+                column[14:20] = p.index(Stone)
+            self._terrain[x] = column
+
+
+def water(world):
+    total = 0
+    for x in world.loaded_columns():
+        for y in range(HEIGHT):
+            block = world.get_block((x, y))
+            if isinstance(block, Water):
+                total += block.data["level"]
+    return total
+
+
+def flow(world, ticks=300):
+    for _ in range(ticks):
+        world.fluids.update()
+
+
+def test_water_flows_into_a_cave_loaded_beside_a_lake(make_world):
+    world = make_world(Lake(), -3, 0)
+    flow(world)
+    assert not world.fluids.active()
+    before = water(world)
+    world.pregenerate(0, 5)
+    assert world.fluids.active()
+    flow(world)
+    assert isinstance(world.get_block((0, 10)), Water)
+    assert water(world) == before
+
+
+def test_water_is_conserved(make_world):
+    world = make_world(Lake(), -3, 5)
+    before = water(world)
+    for _ in range(20):
+        flow(world, 7)
+        assert water(world) == before
+    assert isinstance(world.get_block((3, 10)), Water)
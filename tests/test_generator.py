@@ -0,0 +1,77 @@
+import random
+
+import numpy as np
+import pytest
+
+from CONFIGURATION import HEIGHT
+from generator import Generator
+from mods.minecraft import SimpleGenerator
+from palette import Palette
+
+# shared, so the same blocks have the same indices in the columns of all generators
+PALETTE = Palette()
+
+
+def generator():
+    return SimpleGenerator({"seed": 3, "tree_density": 0.6, "house_density": 0.05}, PALETTE)
+
+
+def same(a, b):
+    return all(np.array_equal(a[x], b[x]) for x in a) and a.keys() == b.keys()
+
+
+def test_batch_size_and_order_dont_matter():
+    expected = generator().generate_range(-200, 200)
+    g = generator()
+    xs = list(range(-200, 200))
+    random.Random(1).shuffle(xs)
+    assert same({x: g(x).copy() for x in xs}, expected)
+
+
+def test_discard_forgets_everything_around_the_column():
+    g = generator()
+    g.generate_range(0, 300)
+    for x in range(0, 300):
+        g.discard(x)
+    assert not g._generated and not g._terrain and not g._decorated and not g._placements
+
+
+def test_regenerating_discarded_columns():
+    expected = generator().generate_range(0, 300)
+    g = generator()
+    g.generate_range(0, 300)
+    # structures of discarded columns have to be planned again, without adding them twice to the others
+    for x in range(100, 200, 3):
+        g.discard(x)
+    assert same({x: g(x) for x in range(0, 300)}, expected)
+    assert not g._placements.keys() & g._generated.keys()
+
+
+def test_state_stays_next_to_generated_columns():
+    g = generator()
+    r = g.structure_radius
+    for b in range(0, 4096, 16):
+        g.generate_range(b, b + 16)
+        for x in range(b, b + 16):
+            g.discard(x)
+        # like a worker process, nothing but the edges of the last batch are kept
+        assert len(g._terrain) <= 2 * r and len(g._decorated) <= 4 * r and len(g._placements) <= 4 * r
+
+
+def test_terrain_from_single_columns():
+    class Single(Generator):
+        def _generate(self, x):
+            self._terrain[x] = np.full(HEIGHT, x + 10, np.uint16)
+
+    assert [int(c[0]) for c in Single().generate_range(-2, 2).values()] == [8, 9, 10, 11]
+
+
+def test_generator_without_terrain():
+    with pytest.raises(NotImplementedError):
+        Generator()(0)
+
+
+def test_negative_seed():
+    a = SimpleGenerator({"seed": -5}, PALETTE).generate_range(0, 8)
+    assert same(a, SimpleGenerator({"seed": -5}, PALETTE).generate_range(0, 8))
+    assert not same(a, SimpleGenerator({"seed": 5}, PALETTE).generate_range(0, 8))
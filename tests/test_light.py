@@ -0,0 +1,56 @@
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from light import LightEngine, MAX_LIGHT
+from mods.minecraft.blocks import Air, Stone, Lava
+from palette import Palette
+
+PALETTE = Palette()
+
+
+def tunnel(x):
+    """Stone up to y = 20 with a tunnel at y = 10, lava at its end at x = 0."""
+    p = PALETTE
+    column = np.full(HEIGHT, p.index(Air), p.dtype)
+    column[:20] = p.index(Stone)
+    column[10] = p.index(Lava, {"level": Lava.max_level}) if x == 0 else p.index(Air)
+    return column
+
+
+def engine(xs):
+    light = LightEngine(PALETTE)
+    for x in xs:
+        light.add_column(x, tunnel(x))
+    return light
+
+
+def test_light_spreads_from_emitters_and_the_sky():
+    light = engine(range(6))
+    assert [light.block[x][10] for x in range(6)] == [15, 14, 13, 12, 11, 10]
+    assert [light.sky[x][10] for x in range(6)] == [0] * 6
+    assert light.sky[3][20] == light.sky[3][HEIGHT - 1] == MAX_LIGHT
+
+
+def test_light_does_not_depend_on_the_loading_order():
+    forward, backward = engine(range(6)), engine(range(5, -1, -1))
+    for x in range(6):
+        assert forward.block[x] == backward.block[x] and forward.sky[x] == backward.sky[x]
+
+
+def test_removed_emitter_takes_its_light_along():
+    light = engine(range(6))
+    column = light._columns[0]
+    column[10] = PALETTE.index(Air)
+    light.update_block(0, 10)
+    assert [light.block[x][10] for x in range(6)] == [0] * 6
+    assert (3, 10) in light.changed
+
+
+def test_unloaded_column_takes_its_light_along():
+    light = engine(range(6))
+    light.changed.clear()
+    light.remove_column(0)
+    assert [light.block[x][10] for x in range(1, 6)] == [0] * 5
+    assert (5, 10) in light.changed
+    light.add_column(0, tunnel(0))
+    assert [light.block[x][10] for x in range(6)] == [15, 14, 13, 12, 11, 10]
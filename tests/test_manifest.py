@@ -0,0 +1,48 @@
+import sys
+
+import pytest
+
+from manifest import ModLoader
+from world_scene import create_world
+
+MOD = '''from block import Block
+
+
+class Glass(Block):
+    image_paths = {"normal": "assets/minecraft/textures/blocks/glass.png"}
+'''
+
+
+@pytest.fixture
+def loader(tmp_path, monkeypatch):
+    # a second mod next to the minecraft one, the mods package is a namespace package
+    mod = tmp_path / "mods" / "glassmod"
+    mod.mkdir(parents=True)
+    (mod / "__init__.py").write_text(MOD)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield ModLoader(str(tmp_path / "mods"), str(tmp_path / ".cache"))
+    sys.modules.pop("mods.glassmod", None)
+
+
+def test_manifest_is_cached(loader, tmp_path):
+    assert loader.items("block") == {"glassmod:Glass": {
+        "module": "mods.glassmod", "kind": "block", "assets": ["assets/minecraft/textures/blocks/glass.png"]}}
+    assert not loader.cached
+    again = ModLoader(str(tmp_path / "mods"), str(tmp_path / ".cache"))
+    assert again.manifest == loader.manifest and again.cached
+
+
+def test_mods_are_imported_when_used(loader):
+    mods = loader.load(["glassmod"])
+    assert "mods.glassmod" not in sys.modules
+    assert mods["glassmod"].Glass.__name__ == "Glass"
+    assert "mods.glassmod" in sys.modules
+
+
+def test_world_creation_only_imports_the_generator_mod(loader):
+    mods = loader.load(["glassmod"])
+    mods.update(ModLoader().load(["minecraft"]))
+    modpack = {"generator": "minecraft:SimpleGenerator", "gravity": (0, -20), "workers": 0}
+    create_world(modpack, mods).close()
+    assert mods["minecraft"]._module is not None
+    assert mods["glassmod"]._module is None
@@ -0,0 +1,18 @@
+from mods.minecraft import Player
+from object import RotationCache, rotations
+
+
+def test_prewarm_fills_the_cache_faces_draw_from():
+    player = Player((0, 0))
+    cache = RotationCache(resolution=90)
+    for part in player.images.values():
+        for f in player.prewarm_faces:
+            getattr(part, f).cache = cache
+    before = rotations.size
+    player.prewarm()
+    faces = len(player.images) * len(player.prewarm_faces)
+    assert len(cache._images) == 4 * faces
+    assert rotations.size == before
+    part = next(iter(player.images.values()))
+    face = getattr(part, player.prewarm_faces[0])
+    assert cache.get(face.key, face, 90) is cache.get(face.key, face, 91)
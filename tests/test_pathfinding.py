@@ -0,0 +1,85 @@
+from mods.minecraft.blocks import Air, Stone
+from pathfinding import WALK_COST, JUMP_COST, FALL_COST
+
+# the height of the Flat terrain of the world fixture
+GROUND = 10
+
+
+def wall(world, x, height, y=GROUND):
+    with world.edit():
+        for y in range(y, y + height):
+            world.set_block((x, y), Stone)
+
+
+def dig(world, x, depth):
+    with world.edit():
+        for y in range(GROUND - depth, GROUND):
+            world.set_block((x, y), Air)
+
+
+def test_walk(world):
+    assert sorted(world.paths.moves((0, GROUND))) == [(-1, GROUND, WALK_COST), (1, GROUND, WALK_COST)]
+    # not standing on anything
+    assert world.paths.moves((0, GROUND + 1)) == []
+
+
+def test_jump(world):
+    wall(world, 1, 1)
+    assert (1, GROUND + 1, JUMP_COST) in world.paths.moves((0, GROUND))
+    # no room for the head under a ceiling
+    wall(world, 0, 1, GROUND + 2)
+    assert world.paths.moves((0, GROUND)) == [(-1, GROUND, WALK_COST)]
+
+
+def test_fall(world):
+    dig(world, 1, 3)
+    assert (1, GROUND - 3, WALK_COST + 3 * FALL_COST) in world.paths.moves((0, GROUND))
+    dig(world, -1, 4)
+    assert all(m[0] != -1 for m in world.paths.moves((0, GROUND)))
+
+
+def test_find(world):
+    wall(world, 5, 1)
+    path = world.paths.find((0, GROUND), (10, GROUND))
+    assert path[0] == (0, GROUND) and path[-1] == (10, GROUND)
+    assert (5, GROUND + 1) in path
+    for a, b in zip(path, path[1:]):
+        assert b in [m[:2] for m in world.paths.moves(a)]
+
+
+def test_unreachable_goal(world):
+    wall(world, 5, 2)
+    req = world.paths.request((0, GROUND), (10, GROUND))
+    while not req.done:
+        world.paths.update()
+    assert req.path is None
+    assert req.partial[-1] == (4, GROUND)
+
+
+def test_results_are_kept_while_their_columns_dont_change(world):
+    paths = world.paths
+    paths.find((0, GROUND), (10, GROUND))
+    # columns loaded and changed far away don't matter
+    world.pregenerate(40, 60)
+    wall(world, 30, 2)
+    assert paths.request((0, GROUND), (10, GROUND)).done
+    wall(world, 5, 2)
+    req = paths.request((0, GROUND), (10, GROUND))
+    assert not req.done
+    assert paths.find((0, GROUND), (10, GROUND)) is None
+
+
+def test_budget_is_a_node_count(world):
+    paths = world.paths
+    paths.budget = 8
+    ticks = []
+    for _ in range(2):
+        paths._results.clear()
+        req = paths.request((0, GROUND), (30, GROUND))
+        expanded = [0]
+        while not req.done:
+            paths.update()
+            expanded.append(req.expanded)
+        assert all(b - a <= 8 for a, b in zip(expanded, expanded[1:]))
+        ticks.append(len(expanded))
+    assert ticks[0] == ticks[1] >= 30 // 8
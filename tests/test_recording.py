@@ -0,0 +1,55 @@
+from control_handler import ScriptedInput
+from headless import run, replay
+from recording import Recording
+
+MODPACK = {
+    "mods": ["minecraft"],
+    "generator": "minecraft:SimpleGenerator",
+    "generator_config": {"seed": 0},
+    "controller": ["minecraft:ExploreGravityControl"],
+    "player": ("minecraft:Player", (-5, 110)),
+    "gravity": (0, -20),
+    "save": None,
+    "workers": 0,
+    "view_distance": 24,
+}
+
+
+def record(path, actions, ticks):
+    run(dict(MODPACK, record=str(path)), ticks, ScriptedInput(actions))
+    return Recording.load(str(path))
+
+
+def test_replay_matches_recording(tmp_path):
+    actions = [{"tick": 5, "press": "K_RIGHT"}, {"tick": 40, "mouse": [100, 50]}, {"tick": 90, "release": "K_RIGHT"}]
+    recording = record(tmp_path / "walk.rec", actions, 150)
+    assert recording.ticks == 150
+    assert [t for t, _ in recording.checksums] == [60, 120, 150]
+    report = replay(str(tmp_path / "walk.rec"))
+    assert report["checksums"] == 3
+    assert report["diverged_at"] is None
+
+
+def test_events_on_checkpoint_tick(tmp_path):
+    # the player stands on the ground by then, the jump changes its velocity in the tick of the checkpoint
+    actions = [{"tick": 120, "press": "K_UP"}, {"tick": 121, "release": "K_UP"}]
+    recording = record(tmp_path / "jump.rec", actions, 180)
+    assert {"tick": 120, "keydown": 1073741906} in recording.actions
+    assert replay(str(tmp_path / "jump.rec"))["diverged_at"] is None
+
+
+def test_changed_input_diverges(tmp_path):
+    path = tmp_path / "walk.rec"
+    recording = record(path, [{"tick": 5, "press": "K_RIGHT"}], 130)
+    recording.actions = [a for a in recording.actions if "pressed" not in a]
+    recording.save(str(path))
+    assert replay(str(path))["diverged_at"] == 60
+
+
+def test_walking_does_not_depend_on_the_tick_rate():
+    for rate in (60, 20):
+        # falls onto the ground first, then walks right for three seconds, nothing is in the way with this seed
+        actions = [{"tick": 2 * rate, "press": "K_RIGHT"}, {"tick": 5 * rate, "release": "K_RIGHT"}]
+        modpack = dict(MODPACK, generator_config={"seed": 5}, tick_rate=rate)
+        x = run(modpack, 6 * rate, ScriptedInput(actions))["player"][0]
+        assert abs(x - (MODPACK["player"][1][0] + 10)) < 1e-6
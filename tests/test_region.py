@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+import pytest
+
+from CONFIGURATION import HEIGHT
+from mods.minecraft.blocks import Air, Stone, Water
+from palette import Palette
+from region import RegionFile, RegionStorage, REGION_SIZE, encode_column, decode_column
+
+
+def column(palette, top=10):
+    a = np.full(HEIGHT, palette.index(Air), palette.dtype)
+    a[:top] = palette.index(Stone)
+    a[top] = palette.index(Water, {"level": 3})
+    return a
+
+
+def test_columns_survive_another_palette():
+    a, b = Palette(), Palette()
+    b.index(Water, {"level": 5})
+    decoded = decode_column(b, encode_column(a, column(a)))
+    assert [b[i] for i in decoded] == [a[i] for i in column(a)]
+
+
+def test_offset_table_is_read_back(tmp_path):
+    path = str(tmp_path / "r.0.region")
+    region = RegionFile(path)
+    region.write(3, b"abc")
+    region.write(REGION_SIZE - 1, b"defg")
+    region.close()
+    region = RegionFile(path)
+    assert 3 in region and REGION_SIZE - 1 in region and 0 not in region
+    assert region.read(3) == b"abc" and region.read(REGION_SIZE - 1) == b"defg"
+    assert region.read(0) is None
+    region.close()
+
+
+def test_columns_are_rewritten_in_place_when_they_fit(tmp_path):
+    region = RegionFile(str(tmp_path / "r.0.region"))
+    region.write(0, b"12345")
+    offset = region._table[0][0]
+    region.write(0, b"123")
+    assert region._table[0] == (offset, 3)
+    region.write(1, b"x")
+    region.write(0, b"1234567")
+    assert region._table[0][0] > offset
+    assert region.read(0) == b"1234567" and region.read(1) == b"x"
+    region.close()
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / "r.0.region"
+    path.write_bytes(b"not a region file at all")
+    with pytest.raises(ValueError):
+        RegionFile(str(path))
+
+
+def test_storage_splits_columns_into_regions(tmp_path):
+    palette = Palette()
+    storage = RegionStorage(str(tmp_path))
+    xs = [-REGION_SIZE - 1, -1, 0, 5, REGION_SIZE]
+    for x in xs:
+        storage.save(x, palette, column(palette, 10 + x % 7))
+    storage.close()
+    assert sorted(os.listdir(tmp_path)) == ["r.-1.region", "r.-2.region", "r.0.region", "r.1.region"]
+    storage = RegionStorage(str(tmp_path))
+    for x in xs:
+        assert x in storage
+        assert np.array_equal(storage.load(x, palette), column(palette, 10 + x % 7))
+    assert 1 not in storage and storage.load(2 * REGION_SIZE, palette) is None
+    storage.close()
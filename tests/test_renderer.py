@@ -0,0 +1,12 @@
+from CONFIGURATION import SCALE
+from renderer import TileRenderer, TILE_SIZE
+
+
+def test_tiles_stay_within_the_budget(world):
+    renderer = TileRenderer(world, budget=2 ** 20)
+    for tx in range(8):
+        renderer.tile(tx, 0)
+        assert renderer.size <= renderer.budget
+    assert renderer.size > renderer.budget - 4 * (TILE_SIZE * SCALE) ** 2
+    # the most recently used tiles are kept
+    assert renderer.tile(7, 0) is renderer.tile(7, 0)
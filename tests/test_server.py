@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pygame
+import pytest
+
+from mods.minecraft.blocks import Air, Stone, Dirt
+from server import (Server, Client, ProtocolError, frame, unpack_all, parse_hello, HELLO, INPUT, WELCOME,
+                    COLUMN, UNLOAD, MOVE, BLOCKS, INPUT_ACTION, COLUMN_HEADER, MOVE_ENTRY, PRESS, encode_blocks)
+
+MODPACK = {
+    "mods": ["minecraft"],
+    "generator": "minecraft:SimpleGenerator",
+    "controller": ["minecraft:ExploreGravityControl"],
+    "player": ("minecraft:Player", (-5, 110)),
+    "gravity": (0, -20),
+    "save": None,
+    "workers": 0,
+    "view_distance": 24,
+}
+
+
+def test_unpack_all():
+    assert unpack_all(COLUMN_HEADER, b"\x01\x00\x00\x00\xff\xff\xff\xff") == [(1,), (-1,)]
+    assert unpack_all(MOVE_ENTRY, b"\x00" * 16, 4) == [(0, 0.0, 0.0)]
+    with pytest.raises(ProtocolError):
+        unpack_all(COLUMN_HEADER, b"\x00" * 5)
+    with pytest.raises(ProtocolError):
+        unpack_all(MOVE_ENTRY, b"\x00" * 2, 4)
+
+
+def test_parse_hello():
+    assert parse_hello(json.dumps({"name": "a"}).encode()) == "a"
+    assert parse_hello(b"{}") == ""
+    for bad in (b"{", b"[]", b'{"name": 1}', b"\xff"):
+        with pytest.raises(ProtocolError):
+            parse_hello(bad)
+
+
+def test_client_rejects_broken_messages():
+    client = Client()
+    with pytest.raises(ProtocolError):
+        client._handle(UNLOAD, b"\x00" * 6)
+    with pytest.raises(ProtocolError):
+        client._handle(MOVE, b"\x00" * 7)
+    with pytest.raises(ProtocolError):
+        client._handle(BLOCKS, b"not zlib")
+    with pytest.raises(ProtocolError):
+        client._handle(BLOCKS, encode_blocks(client.palette, [0], [300], [client.palette.index(Air)]))
+
+
+async def started():
+    server = Server(MODPACK, interest_radius=16)
+    await server.listen(port=0)
+    return server, server._servers[0].sockets[0].getsockname()[1]
+
+
+async def run(server, ticks):
+    for _ in range(ticks):
+        server.step()
+        await asyncio.sleep(0.001)
+
+
+def test_round_trip():
+    async def session():
+        server, port = await started()
+        client = Client()
+        await client.connect(port=port, name="a")
+        client.press(pygame.K_RIGHT)
+        await run(server, 60)
+        await client.receive(timeout=0.2)
+        x = min(client.columns)
+        column = [b.id for b in server.world.get_column(x)]
+        client.close()
+        await server.close()
+        return client, x, column
+
+    client, x, column = asyncio.run(session())
+    assert client.player_id == 1 and client.tick_rate == 60
+    assert len(client.columns) >= 32
+    assert [client.palette[i].id for i in client.columns[x]] == column
+    # it walked to the right
+    assert client.entities[1][0] > -5
+
+
+def test_changed_cells_are_sent_as_deltas():
+    async def session():
+        server, port = await started()
+        client = Client()
+        await client.connect(port=port, name="a")
+        await run(server, 30)
+        await client.receive(timeout=0.2)
+        kinds = []
+        handle = client._handle
+        client._handle = lambda kind, payload: kinds.append(kind) or handle(kind, payload)
+        world = server.world
+        x = min(client.columns)
+        with world.edit():
+            world.set_block((x, 120), Stone)
+            world.set_block((x, 121), Dirt)
+            world.set_block((x, 121), Stone)
+        world.set_block((x + 1, 0), Air)
+        await run(server, 2)
+        await client.receive(timeout=0.2)
+        columns = {i: [b.id for b in world.get_column(i)] for i in (x, x + 1)}
+        client.close()
+        await server.close()
+        return client, columns, kinds
+
+    client, columns, kinds = asyncio.run(session())
+    assert kinds.count(BLOCKS) == 1 and COLUMN not in kinds
+    for x, column in columns.items():
+        assert [client.palette[i].id for i in client.columns[x]] == column
+
+
+@pytest.mark.parametrize("message", [
+    frame(HELLO, b"{not json"),
+    frame(HELLO, b"[1, 2]"),
+    frame(INPUT, INPUT_ACTION.pack(PRESS, 1, 0, 0)),
+    frame(HELLO, b"{}") + frame(INPUT, b"\x00" * 5),
+    frame(HELLO, b"{}") + frame(INPUT, INPUT_ACTION.pack(9, 1, 0, 0)),
+    frame(HELLO, b"{}") + frame(WELCOME, b""),
+    b"\xff\xff\xff\xff\x00",
+])
+def test_broken_clients_are_disconnected(message):
+    async def session():
+        server, port = await started()
+        good = Client()
+        await good.connect(port=port, name="good")
+        reader, writer = await asyncio.open_connection(port=port)
+        writer.write(message)
+        await run(server, 5)
+        # the server closes the connection (after the WELCOME if the HELLO was fine), reading ends
+        await asyncio.wait_for(reader.read(), 1)
+        sessions = [s.name for s in server.sessions]
+        await run(server, 5)
+        await good.receive(timeout=0.1)
+        writer.close()
+        good.close()
+        await server.close()
+        return sessions, good
+
+    sessions, good = asyncio.run(session())
+    assert sessions == ["good"]
+    assert good.columns
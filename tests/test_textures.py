@@ -0,0 +1,18 @@
+from textures import TextureAtlas, TextureRegistry
+
+STONE = "assets/minecraft/textures/blocks/stone.png"
+MISSING = "assets/minecraft/textures/blocks/missing.png"
+
+
+def test_missing_texture_doesnt_break_the_atlas(caplog):
+    atlas = TextureAtlas(TextureRegistry())
+    atlas.add(MISSING)
+    stone = atlas.get(STONE)
+    missing = atlas.get(MISSING)
+    assert stone.get_size() == (16, 16)
+    assert missing.get_at((0, 0)) == (255, 0, 255, 255)
+    assert len(caplog.records) == 1
+    # the placeholder is kept, rebuilding doesn't warn again
+    atlas.add("assets/minecraft/textures/blocks/dirt.png")
+    atlas.surface
+    assert len(caplog.records) == 1
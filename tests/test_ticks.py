@@ -0,0 +1,26 @@
+from mods.minecraft.blocks import Air, Grass, Sand
+
+
+def test_unloaded_columns_leave_nothing_behind(make_world):
+    world = make_world(x0=0, x1=4)
+    ticks = world.ticks
+    with world.edit():
+        world.set_block((1, 10), Grass)
+        world.set_block((2, 14), Sand)
+    assert ticks.is_scheduled((2, 14)) and ticks._random_xs == [1]
+    # a tick for a column that isn't loaded
+    ticks.schedule((9, 14), 1, Sand)
+    for x in range(4):
+        world._unload(x)
+    world.update(world.tick_length)
+    assert not ticks._scheduled and not ticks._queue
+    assert not ticks._random_cells and not ticks._random_xs and not ticks._random_index
+    assert not ticks._random_counts.any()
+
+
+def test_falling_sand(world):
+    world.set_block((2, 14), Sand)
+    for _ in range(20):
+        world.ticks.update()
+    assert isinstance(world.get_block((2, 10)), Sand)
+    assert isinstance(world.get_block((2, 14)), Air)
@@ -0,0 +1,15 @@
+from util import Rect
+
+
+def test_rect_constructors():
+    assert list(Rect(1, 2, 3, 4)) == [1, 2, 3, 4]
+    assert list(Rect((1, 2), (3, 4))) == [1, 2, 3, 4]
+    assert list(Rect((1, 2, 3, 4))) == [1, 2, 3, 4]
+    assert list(Rect(Rect(1, 2, 3, 4))) == [1, 2, 3, 4]
+
+
+def test_rect_collide():
+    r = Rect(0, 0, 1, 2)
+    assert r.collide(Rect(0.5, 1, 1, 1))
+    assert r.collide((0.5, 1, 1, 1))
+    assert not r.collide(Rect(2, 0, 1, 1))
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import time
+
+from conftest import Flat
+from mods.minecraft import SimpleGenerator, SimpleGeneratorConfiguration, Player
+from util import Rect
+
+
+def test_reconfigure_notifies_subscribers(make_world):
+    configuration = SimpleGeneratorConfiguration({"seed": 0}, editable=True)
+    world = make_world(SimpleGenerator(configuration), 0, 20)
+    changes = []
+    world.subscribe(changes.extend)
+    configuration.seed = 1
+    world.update(world.tick_length)
+    assert {c.pos[0] for c in changes} == set(range(20))
+    for c in changes:
+        assert world.get_block(c.pos) is c.new and c.old is not c.new
+
+
+class WorkerFailure(Flat):
+    """Fails in the worker processes, `crash` kills them."""
+    crash = False
+
+    def _generate_range(self, x0, x1):
+        if multiprocessing.parent_process() is not None:
+            if self.crash:
+                os._exit(1)
+            raise RuntimeError("broken generator")
+        super()._generate_range(x0, x1)
+
+
+def wait_for_workers(world, ticks=200):
+    for _ in range(ticks):
+        world.update(world.tick_length)
+        if not world._pending:
+            return
+        time.sleep(0.01)
+
+
+def test_failed_worker_columns_are_generated_here(make_world, caplog):
+    world = make_world(WorkerFailure(), 0, 0, workers=1)
+    world.track(Player((0, 0)))
+    wait_for_workers(world)
+    assert world._blocks and not world._pending
+    assert "broken generator" in caplog.text
+
+
+def test_workers_are_restarted_after_a_crash(make_world, caplog):
+    generator = WorkerFailure()
+    generator.crash = True
+    world = make_world(generator, 0, 0, workers=1)
+    world.track(Player((0, 0)))
+    executor = world._executor
+    for _ in range(100):
+        world.update(world.tick_length)
+        if world._executor is not executor:
+            break
+        time.sleep(0.02)
+    assert world._executor is not executor
+    assert "BrokenProcessPool" in caplog.text
+
+
+def test_spatial_hash_follows_objects_moved_outside_the_step(world):
+    a, b = Player((0, 10)), Player((12, 10))
+    world.add(a)
+    world.add(b)
+    for _ in range(30):
+        world.update(world.tick_length)
+    assert a.one_ground and b.one_ground
+    # teleported while resting, and moved to where the terrain isn't loaded
+    a.pos = b.pos
+    b.pos = (500, 10)
+    world.update(world.tick_length)
+    assert world.spatial.query(Rect(11, 9, 2, 4)) == {a._slot}
+    assert world.spatial.query(Rect(499, 9, 2, 4)) == {b._slot}
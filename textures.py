@@ -0,0 +1,115 @@
+import logging
+from typing import Dict, List, Tuple
+
+import pygame
+
+logger = logging.getLogger(__name__)
+
+area = Tuple[int, int, int, int]
+
+
+def missing_texture(size: int = 16) -> pygame.Surface:
+    """Magenta and black checkers, drawn instead of textures that can't be loaded."""
+    sur = pygame.Surface((size, size), pygame.SRCALPHA)
+    sur.fill((0, 0, 0, 255))
+    half = size // 2
+    sur.fill((255, 0, 255, 255), (0, 0, half, half))
+    sur.fill((255, 0, 255, 255), (half, half, size - half, size - half))
+    return sur
+
+
+def _convert(sur: pygame.Surface) -> pygame.Surface:
+    if pygame.display.get_init() and pygame.display.get_surface() is not None:
+        return sur.convert_alpha()
+    return sur
+
+
+class TextureRegistry:
+    """Process-wide cache of decoded images, every asset path is loaded from disk only once."""
+
+    def __init__(self):
+        self._textures: Dict[str, pygame.Surface] = {}
+
+    def __contains__(self, path):
+        return path in self._textures
+
+    def add(self, path: str, surface: pygame.Surface):
+        """Use `surface` for `path` instead of loading the file."""
+        self._textures[path] = _convert(surface)
+
+    def load(self, path: str) -> pygame.Surface:
+        if path not in self._textures:
+            self._textures[path] = _convert(pygame.image.load(path))
+        return self._textures[path]
+
+    def clear(self):
+        self._textures = {}
+
+
+class TextureAtlas:
+    """Packs many small textures into one surface. Textures are referenced by their region in the atlas."""
+
+    def __init__(self, textures: TextureRegistry, width=256):
+        self._textures = textures
+        self._width = width
+        self._paths: List[str] = []
+        self._regions: Dict[str, area] = {}
+        self._images: Dict[str, pygame.Surface] = {}
+        self._surface: pygame.Surface = None
+
+    def add(self, path: str):
+        if path not in self._paths:
+            self._paths.append(path)
+            self._surface = None
+
+    @property
+    def surface(self) -> pygame.Surface:
+        if self._surface is None:
+            self._build()
+        return self._surface
+
+    def region(self, path: str) -> area:
+        if path not in self._regions or self._surface is None:
+            self.add(path)
+            self._build()
+        return self._regions[path]
+
+    def get(self, path: str) -> pygame.Surface:
+        if path not in self._images:
+            r = self.region(path)
+            self._images[path] = self.surface.subsurface(r)
+        return self._images[path]
+
+    def _load(self, path: str) -> pygame.Surface:
+        try:
+            return self._textures.load(path)
+        except (OSError, pygame.error) as e:
+            # one broken block shouldn't stop all others from being drawn, the placeholder is kept for the path
+            logger.warning("can't load texture '%s': %s", path, e)
+            self._textures.add(path, missing_texture())
+            return self._textures.load(path)
+
+    def _build(self):
+        images = {p: self._load(p) for p in self._paths}
+        width = max([self._width] + [i.get_width() for i in images.values()])
+        # simple shelf packing: tallest textures first, new shelf when a row is full
+        x = y = shelf = 0
+        regions = {}
+        for p in sorted(self._paths, key=lambda p: -images[p].get_height()):
+            w, h = images[p].get_size()
+            if x + w > width:
+                x, y, shelf = 0, y + shelf, 0
+            regions[p] = (x, y, w, h)
+            x += w
+            shelf = max(shelf, h)
+        sur = pygame.Surface((width, max(y + shelf, 1)), pygame.SRCALPHA)
+        sur.fill((0, 0, 0, 0))
+        for p, r in regions.items():
+            sur.blit(images[p], r[:2])
+        self._surface = _convert(sur)
+        self._regions = regions
+        self._images = {}
+
+
+textures = TextureRegistry()
+block_atlas = TextureAtlas(textures)
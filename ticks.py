@@ -0,0 +1,156 @@
+import heapq
+import random
+from itertools import count
+from typing import Dict, List, Tuple, Type
+
+import numpy as np
+
+from CONFIGURATION import HEIGHT
+from block import Block
+
+pos = Tuple[int, int]
+
+NEIGHBORS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+class TickScheduler:
+    """Block updates of a world.
+
+    Scheduled ticks: `schedule` queues a `scheduled_tick` of the block at a position some ticks ahead, at most one
+    per position. Random ticks: every block with `random_ticks` gets a `random_tick` with a chance of
+    `random_ticks_per_column / HEIGHT` per tick, like `random_ticks_per_column` random cells of every column were
+    picked. Only the cells of such blocks are kept per column, so the cost per tick depends on the number of
+    updates and not on the number of loaded blocks. Blocks with `neighbor_updates` get `neighbor_changed` when they
+    or a block next to them changed. Scheduled ticks of columns that are unloaded, or not loaded when they are
+    due, are dropped, so nothing is kept for columns that were left behind."""
+
+    def __init__(self, world, random_ticks_per_column: int = 3, max_scheduled: int = 65536, seed: int = 0):
+        self.world = world
+        self.random_ticks_per_column = random_ticks_per_column
+        self.max_scheduled = max_scheduled
+        # for the blocks, the scheduler draws whole arrays from `_rng`
+        self.random = random.Random(seed)
+        self._rng = np.random.default_rng(seed)
+        self.tick = 0
+        self._queue: List[Tuple[int, int, int, int, Type[Block]]] = []
+        self._scheduled: Dict[pos, int] = {}
+        self._order = count()
+        self._random_cells: Dict[int, np.ndarray] = {}
+        # columns with random tick cells and their number of cells, for drawing the ticks of all at once
+        self._random_xs: List[int] = []
+        self._random_counts = np.zeros(64, np.int64)
+        self._random_index: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self._scheduled)
+
+    def schedule(self, item: pos, delay: int, block: Type[Block]):
+        """A `scheduled_tick` of the block at `item` in `delay` ticks, if it is still a `block` then."""
+        t = self.tick + max(delay, 1)
+        if self._scheduled.get(item, t + 1) <= t:
+            return
+        self._scheduled[item] = t
+        heapq.heappush(self._queue, (t, next(self._order), item[0], item[1], block))
+
+    def is_scheduled(self, item: pos) -> bool:
+        return item in self._scheduled
+
+    def add_column(self, x: int, column: np.ndarray):
+        self.update_column(x, column)
+
+    def update_column(self, x: int, column: np.ndarray):
+        cells = np.flatnonzero(self.world.palette.table("random_ticks", bool)[column])
+        if not len(cells):
+            self._remove_random(x)
+            return
+        self._random_cells[x] = cells
+        i = self._random_index.get(x)
+        if i is None:
+            i = self._random_index[x] = len(self._random_xs)
+            self._random_xs.append(x)
+            if i == len(self._random_counts):
+                self._random_counts = np.concatenate([self._random_counts, np.zeros_like(self._random_counts)])
+        self._random_counts[i] = len(cells)
+
+    def remove_column(self, x: int):
+        self._remove_random(x)
+        if any(p[0] == x for p in self._scheduled):
+            self._scheduled = {p: t for p, t in self._scheduled.items() if p[0] != x}
+            self._queue = [e for e in self._queue if e[2] != x]
+            heapq.heapify(self._queue)
+
+    def _remove_random(self, x: int):
+        self._random_cells.pop(x, None)
+        i = self._random_index.pop(x, None)
+        if i is None:
+            return
+        last = self._random_xs.pop()
+        if last != x:
+            self._random_xs[i] = last
+            self._random_index[last] = i
+            self._random_counts[i] = self._random_counts[len(self._random_xs)]
+        self._random_counts[len(self._random_xs)] = 0
+
+    def changed(self, changes):
+        """Updates the random tick cells and notifies the changed blocks and their neighbours."""
+        world = self.world
+        blocks = world._blocks
+        for x in {c.pos[0] for c in changes}:
+            self.update_column(x, blocks[x])
+        table = world.palette.table("neighbor_updates", bool)
+        for c in changes:
+            x, y = c.pos
+            for dx, dy in NEIGHBORS:
+                column = blocks.get(x + dx)
+                if column is not None and 0 <= y + dy < HEIGHT and table[column[y + dy]]:
+                    world.palette[column[y + dy]].neighbor_changed(world, (x + dx, y + dy))
+
+    def update(self):
+        """Runs the due scheduled ticks and the random ticks. Their block changes are applied as one batch."""
+        self.tick += 1
+        with self.world.edit():
+            self._run_scheduled()
+            self._run_random()
+
+    def _run_scheduled(self):
+        world = self.world
+        blocks = world._blocks
+        palette = world.palette
+        done = 0
+        while self._queue and self._queue[0][0] <= self.tick and done < self.max_scheduled:
+            entry = heapq.heappop(self._queue)
+            t, _, x, y, block = entry
+            if self._scheduled.get((x, y)) != t:
+                continue
+            del self._scheduled[x, y]
+            if x not in blocks:
+                continue
+            state = palette[blocks[x][y]]
+            if type(state) is block:
+                state.scheduled_tick(world, (x, y))
+                done += 1
+
+    def _run_random(self):
+        if not self._random_xs:
+            return
+        world = self.world
+        blocks = world._blocks
+        palette = world.palette
+        counts = self._random_counts[:len(self._random_xs)]
+        ticked = self._rng.binomial(counts, self.random_ticks_per_column / HEIGHT)
+        columns = np.flatnonzero(ticked)
+        if not len(columns):
+            return
+        # which of the cells of the column, picked for all ticks at once
+        columns = np.repeat(columns, ticked[columns])
+        picks = (self._rng.random(len(columns)) * counts[columns]).astype(int)
+        xs = [self._random_xs[i] for i in columns.tolist()]
+        for x, pick in zip(xs, picks.tolist()):
+            cells = self._random_cells.get(x)
+            # an earlier random tick of this tick might have changed the column
+            if cells is None or pick >= len(cells):
+                continue
+            y = int(cells[pick])
+            state = palette[blocks[x][y]]
+            if state.random_ticks:
+                state.random_tick(world, (x, y))
@@ -126,7 +126,7 @@ class Vec2d(list):
 class Rect:
     def __init__(self, *args):
         if len(args) == 1:
-            args = args[0]
+            args = tuple(args[0])
         if len(args) == 2:
             (x, y), (w, h) = args
         else:
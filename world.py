@@ -1,100 +1,504 @@
+import logging
+import multiprocessing
+import time
 from collections import namedtuple
-from typing import List, Dict, Tuple, Set
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Set, Callable, Optional, Type, Union, Any
 
+import numpy as np
 import pygame
 
-from CONFIGURATION import SCALE
-from block import Block
-from generator import Generator
+from CONFIGURATION import SCALE, HEIGHT
+from block import Block, Placeholder
+from collision import TileCollider
+from entities import EntityStore
+from fluid import FluidSimulation
+from generator import Generator, _init_worker, _generate_encoded
+from light import LightEngine
 from object import Object
-from util import Vec2d, Rect, LimitedSizeDict
+from palette import Column
+from pathfinding import Pathfinder
+from profiler import profiler
+from region import RegionStorage, decode_column
+from renderer import TileRenderer
+from spatial import SpatialHash
+from ticks import TickScheduler
+from util import Vec2d, Rect
 
 force = pos = Tuple[int, int]
 
-State = namedtuple("state", "img scroll blocks")
+BlockChange = namedtuple("BlockChange", "pos old new")
+
+GENERATION_BATCH = 16
+
+logger = logging.getLogger(__name__)
 
 
 class World:
-    def __init__(self, generator: Generator, gravity: force):
+    def __init__(self, generator: Generator, gravity: force, save_dir: str = None, view_distance: int = 64,
+                 unload_margin: int = 16, workers: int = 0, prefetch: float = 2.0, tick_rate: float = 60,
+                 max_ticks_per_frame: int = 5):
 
         self._generator = generator
+        self.palette = generator.palette
         self.gravity = Vec2d(gravity)
-        self._blocks: Dict[int, List[Block]] = {}
+        self.view_distance = view_distance
+        self.unload_margin = unload_margin
+        self._storage = RegionStorage(save_dir) if save_dir is not None else None
+        self._blocks: Dict[int, np.ndarray] = {}
+        self._solid: Dict[int, np.ndarray] = {}
+        self._collider = TileCollider(self.solid_column)
+        self._unsaved: Set[int] = set()
+        self._modified: Set[int] = set()
+        self._edit: Optional[List[BlockChange]] = None
+        self._subscribers: List[Callable[[List[BlockChange]], None]] = []
+        self.prefetch = prefetch
+        self.workers = workers
+        self._executor: ProcessPoolExecutor = None
+        self._start_workers()
+        self._pending: Dict[int, Future] = {}
+        self._stored: Set[int] = set()
+        self._configuration_version = generator.configuration.version
+        self._fingerprint = generator.fingerprint
+        self.generated = 0
+        self.generation_time = 0.0
+        self._placeholder = self.palette.column(Placeholder)
+        self._placeholder.setflags(write=False)
         self._objects: Set[Object] = set()
-        self._last_states: Dict[Tuple[pos, pos], State] = LimitedSizeDict(size_limit=100)
+        self.entities = EntityStore()
+        self.spatial = SpatialHash()
+        self._tracked: Set[Object] = set()
+        self.tick_rate = tick_rate
+        self.max_ticks_per_frame = max_ticks_per_frame
+        self._accumulator = 0.0
+        self.light = LightEngine(self.palette)
+        self.renderer = TileRenderer(self)
+        self.ticks = TickScheduler(self)
+        self.fluids = FluidSimulation(self)
+        self.paths = Pathfinder(self)
+
+    def _start_workers(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self.workers:
+            self._executor = ProcessPoolExecutor(self.workers, multiprocessing.get_context("spawn"),
+                                                 _init_worker, (self._generator,))
 
     def add(self, obj):
+        obj._move_to(self.entities)
         self._objects.add(obj)
+        self.spatial.update(np.array([obj._slot]), self.entities.pos, self.entities.size)
+
+    def remove(self, obj):
+        self.spatial.remove(obj._slot)
+        self._objects.discard(obj)
+        self._tracked.discard(obj)
+        obj._move_to(EntityStore(1))
+
+    def track(self, obj):
+        """Columns around tracked objects are kept loaded, all others get saved and unloaded."""
+        self.add(obj)
+        self._tracked.add(obj)
 
-    def get_column(self, item: int):
+    def _column(self, item: int, wait=False) -> np.ndarray:
+        """The column array, or a placeholder column while it is generated in the background.
+        With `wait` the column is generated right away instead."""
         if item not in self._blocks:
-            self._blocks[item] = self._generator(item)
+            column = self._storage.load(item, self.palette) if self._storage is not None else None
+            if column is not None:
+                self._stored.add(item)
+            else:
+                if self._executor is not None and not wait:
+                    self._request(item)
+                    return self._placeholder
+                t = time.perf_counter()
+                column = self._generator(item)
+                self.generation_time += time.perf_counter() - t
+                self.generated += 1
+                self._unsaved.add(item)
+            self._add_column(item, column)
         return self._blocks[item]
 
-    def get_block(self, item: pos):
-        return self.get_column(item[0])[item[1]]
+    def _add_column(self, item: int, column: np.ndarray):
+        self._blocks[item] = column
+        self.light.add_column(item, column)
+        self.ticks.add_column(item, column)
+        self.fluids.add_column(item, column)
+        self.paths.invalidate(item)
+        self.renderer.invalidate_column(item)
+        self._flush_light()
 
-    def update(self, dt):
-        # print(1 / dt)
-        for obj in self._objects:
-            obj.pos += obj.velocity * dt
-            x1, y1 = obj.rect.topleft
-            x2, y2 = obj.rect.bottomright
-            x1 = round(x1)
-            x2 = round(x2)
-            y1 = round(y1)
-            y2 = round(y2)
-            points = [(x, y) for x in range(x1 - 2, x2 + 2) for y in range(y1 - 2, y2 + 2)]
-            obj.one_ground = False
-            for r in list(obj.rect.collidelistall([tuple(self.get_block(p).rect) for p in points if self.get_block(p).has_collision])):
-                r: Rect = Rect(r)
-                n = obj.pos - r.center
-                n = n.unit
-
-                if n.x > 0.5:
-                    obj.rect.left = r.right + 0.05
-                    obj.velocity.x = 0
-                    obj.one_wall = True
-                elif n.x < -0.5:
-                    obj.rect.right = r.left - 0.05
-                    obj.velocity.x = 0
-                    obj.one_wall = True
+    def _flush_light(self):
+        for p in self.light.changed:
+            self.renderer.invalidate(p)
+        self.light.changed.clear()
+
+    def loaded_columns(self):
+        return self._blocks.keys()
+
+    def is_ready(self, item: int) -> bool:
+        """Whether `get_column` returns the real column instead of a placeholder."""
+        return item in self._blocks or self._executor is None
+
+    def _request(self, item: int):
+        if item not in self._pending:
+            x0 = item // GENERATION_BATCH * GENERATION_BATCH
+            f = self._executor.submit(_generate_encoded, x0, x0 + GENERATION_BATCH)
+            for x in range(x0, x0 + GENERATION_BATCH):
+                if x not in self._blocks and x not in self._pending:
+                    self._pending[x] = f
+
+    def _collect(self):
+        failed = set()
+        restarted = False
+        for x, f in list(self._pending.items()):
+            if f.done():
+                del self._pending[x]
+                if f.cancelled() or x in self._blocks:
+                    continue
+                error = f.exception()
+                if error is None:
+                    self._add_column(x, decode_column(self.palette, f.result()[x]))
+                    self.generated += 1
+                    self._unsaved.add(x)
+                    continue
+                if f not in failed:
+                    failed.add(f)
+                    logger.error("generating columns in a worker failed", exc_info=error)
+                if isinstance(error, BrokenProcessPool):
+                    # a worker died, the columns are requested again from new workers
+                    if not restarted:
+                        restarted = True
+                        self._start_workers()
                 else:
-                    if n.y > 0:
-                        obj.rect.top = r.bottom
-                        obj.velocity.y = 0
-                        obj.one_ground = True
-                    elif n.y < 0:
-                        obj.rect.bottom = r.top
-                        obj.velocity.y = 0
-                        obj.one_ground = False
-            obj.velocity += self.gravity * dt
+                    # generated here instead
+                    self._column(x, wait=True)
 
-    def get_blocks(self, x_range: pos, y_range: pos) -> pygame.Surface:
-        if (tuple(x_range), tuple(y_range)) in self._last_states:
-            state = self._last_states[(tuple(x_range), tuple(y_range))]
+    def pregenerate(self, x0: int, x1: int, batch: int = 1024):
+        """Generates (and saves, if the world has a save directory) all columns with x0 <= x < x1."""
+        for b in range(x0, x1, batch):
+            for x, column in self._generator.generate_range(b, min(b + batch, x1)).items():
+                if self._storage is not None:
+                    if x not in self._storage:
+                        self._storage.save(x, self.palette, column)
+                    self._generator.discard(x)
+                elif x not in self._blocks:
+                    self._add_column(x, column)
+                    self._unsaved.add(x)
+
+    def _unload(self, item: int):
+        if item in self._unsaved and self._storage is not None:
+            self._storage.save(item, self.palette, self._blocks[item])
+        self._unsaved.discard(item)
+        self._modified.discard(item)
+        self._stored.discard(item)
+        self._generator.discard(item)
+        self._solid.pop(item, None)
+        self.light.remove_column(item)
+        self.ticks.remove_column(item)
+        self.fluids.remove_column(item)
+        del self._blocks[item]
+        self.paths.invalidate(item)
+        self._flush_light()
+
+    def _windows(self, distance: int) -> List[Tuple[int, int]]:
+        windows = []
+        for obj in self._tracked:
+            c = int(obj.pos.x)
+            # columns in the direction of movement are requested before the object gets there
+            ahead = int(obj.velocity.x * self.prefetch)
+            windows.append((c - distance + min(ahead, 0), c + distance + max(ahead, 0)))
+        return windows
+
+    def _reconfigure(self):
+        """Regenerates the loaded columns after the generator configuration changed. Edited columns and those
+        loaded from the save directory (they could have been edited before) are kept."""
+        self._configuration_version = self._generator.configuration.version
+        if self._generator.fingerprint == self._fingerprint:
+            return
+        self._fingerprint = self._generator.fingerprint
+        self._pending.clear()
+        self._start_workers()
+        xs = sorted(x for x in self._blocks if x not in self._modified and x not in self._stored)
+        if not xs:
+            return
+        for x in xs:
+            self.light.remove_column(x)
+        old = {x: self._blocks[x] for x in xs}
+        columns = self._generator.generate_range(xs[0], xs[-1] + 1)
+        for x in xs:
+            self._solid.pop(x, None)
+            self._unsaved.add(x)
+            self._add_column(x, columns[x])
+        self.renderer.clear()
+        self.entities.on_ground[:] = False
+        # the subscribers (clients of a server, the fluids) see the regenerated blocks like edits
+        palette = self.palette
+        changes = [BlockChange((x, y), palette[old[x][y]], palette[columns[x][y]])
+                   for x in xs for y in np.flatnonzero(old[x] != columns[x]).tolist()]
+        if changes:
+            for callback in self._subscribers:
+                callback(changes)
+
+    def preload(self):
+        """Loads the columns around the tracked objects right away, in the order the next tick would load them."""
+        self._stream(wait=True)
+
+    def _stream(self, wait=False):
+        if self._generator.configuration.version != self._configuration_version:
+            self._reconfigure()
+        if self._executor is not None:
+            self._collect()
+        if not self._tracked:
+            return
+        keep = self._windows(self.view_distance + self.unload_margin)
+        for x in [x for x in self._blocks if not any(lo <= x <= hi for lo, hi in keep)]:
+            # edited columns can't be regenerated, without a save directory they have to stay
+            if self._storage is not None or x not in self._modified:
+                self._unload(x)
+        for x in [x for x in self._pending if not any(lo <= x <= hi for lo, hi in keep)]:
+            f = self._pending.pop(x)
+            if f not in self._pending.values():
+                f.cancel()
+        for obj, (lo, hi) in zip(self._tracked, self._windows(self.view_distance)):
+            c = int(obj.pos.x)
+            for x in sorted(range(lo, hi + 1), key=lambda x: abs(x - c)):
+                if x not in self._blocks:
+                    self._column(x, wait)
+
+    def save(self):
+        if self._storage is None:
+            return
+        for x in self._unsaved:
+            self._storage.save(x, self.palette, self._blocks[x])
+        self._unsaved = set()
+
+    def close(self):
+        self.save()
+        if self._storage is not None:
+            self._storage.close()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def solid_column(self, item: int) -> np.ndarray:
+        """`has_collision` of every cell in the column, taken from a table over the palette."""
+        solid = self._solid.get(item)
+        if solid is None:
+            column = self._column(item)
+            solid = self.palette.table("has_collision", bool)[column]
+            if item in self._blocks:
+                self._solid[item] = solid
+        return solid
+
+    def subscribe(self, callback: Callable[[List[BlockChange]], None]):
+        """`callback` gets the list of changes of every `set_block` call or `edit` batch."""
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[List[BlockChange]], None]):
+        self._subscribers.remove(callback)
+
+    def set_block(self, item: pos, block: Union[Block, Type[Block]], data: Dict[str, Any] = None):
+        x, y = item
+        if not 0 <= y < HEIGHT:
+            raise IndexError(f"y={y} is outside of the world")
+        column = self._column(x, wait=True)
+        new = self.palette.index(block, data)
+        old = column[y]
+        if old == new:
+            return
+        column[y] = new
+        change = BlockChange((x, y), self.palette[old], self.palette[new])
+        if self._edit is not None:
+            self._edit.append(change)
         else:
-            size = ((x_range[1] - x_range[0]) * SCALE, (y_range[1] - y_range[0]) * SCALE)
-            state = State(pygame.Surface(size, pygame.SRCALPHA), (tuple(x_range), tuple(y_range)), {})
-            state.img.fill((0, 0, 0, 0))
-            self._last_states[(tuple(x_range), tuple(y_range))] = state
-
-        for x in range(0, x_range[1] - x_range[0]):
-            for y in range(0, y_range[1] - y_range[0] + 1):
-                b = self.get_column(x_range[0] + x)[y_range[0] + y]
-                if (x, y) not in state.blocks or state.blocks[(x, y)] is not b:
-                    state.blocks[(x, y)] = b
-                    xo, yo = b.draw_offset
-                    state.img.blit(b.image, ((x * SCALE) - xo, state.img.get_height() - (y * SCALE) - yo))
-        return state.img
+            self._apply([change])
+
+    def set_states(self, xs: List[int], ys: List[int], states: List[int]):
+        """`set_block` for many cells at once, the blocks given as palette indices."""
+        changes = []
+        palette = self.palette
+        for x, y, new in zip(xs, ys, states):
+            column = self._column(x, wait=True)
+            old = column[y]
+            if old != new:
+                column[y] = new
+                changes.append(BlockChange((x, y), palette[old], palette[new]))
+        if self._edit is not None:
+            self._edit.extend(changes)
+        elif changes:
+            self._apply(changes)
+
+    @contextmanager
+    def edit(self):
+        """Batches all `set_block` calls inside the with block. The blocks change immediately, but light, render
+        and collision data are updated and the subscribers are notified only once at the end."""
+        if self._edit is not None:
+            yield self
+            return
+        self._edit = []
+        try:
+            yield self
+        finally:
+            changes, self._edit = self._edit, None
+            if changes:
+                self._apply(changes)
+
+    def _apply(self, changes: List[BlockChange]):
+        for x in {c.pos[0] for c in changes}:
+            self._solid.pop(x, None)
+            self._unsaved.add(x)
+            self._modified.add(x)
+            self._generator.discard(x)
+        for c in changes:
+            # light only changes with the opacity or emission, not for example with the level of a fluid
+            if c.old.light_opacity != c.new.light_opacity or c.old.light_emission != c.new.light_emission:
+                self.light.update_block(*c.pos)
+            self.renderer.invalidate(c.pos)
+        self._flush_light()
+        # the ground under resting objects might be gone
+        self.entities.on_ground[:] = False
+        for callback in self._subscribers:
+            callback(changes)
+        self.ticks.changed(changes)
+
+    def get_column(self, item: int, wait=False) -> Column:
+        return Column(self.palette, self._column(item, wait))
+
+    def get_block(self, item: pos) -> Block:
+        return self.palette[self._column(item[0])[item[1]]]
+
+    @property
+    def tick_length(self) -> float:
+        return 1 / self.tick_rate
+
+    @property
+    def alpha(self) -> float:
+        """How far the time of the current frame is between the last two ticks."""
+        return min(self._accumulator / self.tick_length, 1.0)
+
+    def advance(self, dt: float, before_tick: Optional[Callable[[float], None]] = None,
+                after_tick: Optional[Callable[[], None]] = None) -> int:
+        """Runs as many fixed length ticks as fit into the time passed, at most `max_ticks_per_frame`.
+        Returns the number of ticks."""
+        self._accumulator += dt
+        tick = self.tick_length
+        ticks = 0
+        while self._accumulator >= tick and ticks < self.max_ticks_per_frame:
+            if before_tick is not None:
+                before_tick(tick)
+            self.update(tick)
+            if after_tick is not None:
+                after_tick()
+            self._accumulator -= tick
+            ticks += 1
+        if self._accumulator >= tick:
+            # we can't catch up, drop the time instead of slowing every following frame down
+            self._accumulator %= tick
+        return ticks
+
+    def interpolated_pos(self, obj: Object) -> Vec2d:
+        e = self.entities
+        if obj._store is not e:
+            return obj.pos
+        p = e.previous[obj._slot] + (e.pos[obj._slot] - e.previous[obj._slot]) * self.alpha + e.size[obj._slot] / 2
+        return Vec2d(p.tolist())
+
+    def _ready_slots(self) -> np.ndarray:
+        e = self.entities
+        slots = e.slots()
+        if self._executor is None:
+            return slots
+        # objects wait until the terrain around them exists
+        x = np.floor(e.pos[slots, 0] + e.size[slots, 0] / 2).astype(int)
+        loaded = np.fromiter(self._blocks, int, len(self._blocks))
+        ready = np.ones(len(slots), bool)
+        for o in range(-2, 3):
+            ready &= np.isin(x + o, loaded)
+        return slots[ready]
+
+    @profiler.timed("world.update")
+    def update(self, dt):
+        self._stream()
+        with profiler.span("world.ticks"):
+            self.ticks.update()
+        with profiler.span("world.fluids"):
+            self.fluids.update()
+        with profiler.span("world.paths"):
+            self.paths.update()
+        e = self.entities
+        e.previous[:] = e.pos
+        slots = self._ready_slots()
+        vel = e.velocity
+        # resting objects would only be pushed into the ground and back, skip their collision
+        resting = e.on_ground[slots] & (vel[slots, 0] == 0) & (vel[slots, 1] <= 0)
+        vel[slots[resting], 1] = 0
+        moving = slots[~resting]
+        motion = vel[moving] * dt
+        for slot, (dx, dy), (x, y), (w, h) in zip(moving.tolist(), motion.tolist(), e.pos[moving].tolist(),
+                                                 e.size[moving].tolist()):
+            r = Rect(x, y, w, h)
+            hit_x, hit_y = self._collider.move(r, (dx, dy))
+            e.pos[slot] = r.x, r.y
+            e.on_wall[slot] = hit_x
+            e.on_ground[slot] = hit_y and dy < 0
+            if hit_x:
+                vel[slot, 0] = 0
+            if hit_y:
+                vel[slot, 1] = 0
+        e.on_wall[slots[resting]] = False
+        vel[slots] += tuple(self.gravity * dt)
+        # all slots, objects can also be moved outside of this step (set pos, not ready yet), the hash only
+        # touches those that changed cells
+        self.spatial.update(e.slots(), e.pos, e.size)
+        self._collide_objects()
+
+    def _collide_objects(self):
+        """Pushes overlapping objects with `has_shape` apart along the axis of least overlap, lighter ones more."""
+        e = self.entities
+        pushed = []
+        for a, b in self.spatial.pairs(e.shape):
+            (ax, ay), (aw, ah) = e.pos[a].tolist(), e.size[a].tolist()
+            (bx, by), (bw, bh) = e.pos[b].tolist(), e.size[b].tolist()
+            ox = min(ax + aw, bx + bw) - max(ax, bx)
+            oy = min(ay + ah, by + bh) - max(ay, by)
+            if ox <= 0 or oy <= 0:
+                continue
+            share = bw * bh / (aw * ah + bw * bh)
+            if ox < oy:
+                sign = -1 if ax + aw / 2 < bx + bw / 2 else 1
+                self._push(a, (sign * ox * share, 0))
+                self._push(b, (-sign * ox * (1 - share), 0))
+            else:
+                lower, upper = (a, b) if ay < by else (b, a)
+                self._push(upper, (0, oy))
+                e.on_ground[upper] = True
+                e.velocity[upper, 1] = max(e.velocity[upper, 1], 0)
+            pushed += [a, b]
+        if pushed:
+            self.spatial.update(np.array(pushed), e.pos, e.size)
+
+    def _push(self, slot: int, motion):
+        e = self.entities
+        r = Rect(*e.pos[slot].tolist(), *e.size[slot].tolist())
+        self._collider.move(r, motion)
+        e.pos[slot] = r.x, r.y
+
+    @profiler.timed("world.get_blocks")
+    def get_blocks(self, x_range: pos, y_range: pos) -> pygame.Surface:
+        return self.renderer.render(x_range, y_range)
 
     def image(self, x_range: pos, y_range: pos) -> Tuple[pygame.Surface, List[Tuple[pygame.Surface, pos]]]:
         x_range = sorted(x_range)
         y_range = sorted(max(min(y, 255), 0) for y in y_range)
         sur = self.get_blocks(x_range, y_range)
         objs_to_draw = []
-        for obj in (obj for obj in self._objects):
-            p = obj.pos
+        view = Rect(x_range[0] - 2, y_range[0] - 2, x_range[1] - x_range[0] + 4, y_range[1] - y_range[0] + 4)
+        for obj in (self.entities.objects[slot] for slot in self.spatial.query(view)):
+            p = self.interpolated_pos(obj)
             if x_range[0] < p.x < x_range[1] and y_range[0] < p.y < y_range[1]:
                 img = obj.image
                 off_x, off_y = obj.draw_offset
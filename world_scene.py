@@ -1,16 +1,30 @@
-from importlib import import_module
+import os
+import sys
 from typing import Tuple, List, Dict, Any
 
 import pygame
 from ezpygame import Scene
 
-from control_handler import ControlHandler
+from control_handler import ControlHandler, Input
+from manifest import loader
 # from object import Object
 from object import Object
+from profiler import profiler, Overlay
+from recording import RecordingInput
 from util import get_mod_item
 from world import World
 
 
+def create_world(modpack: Dict[str, Any], mods: Dict[str, Any]) -> World:
+    """The world of `modpack`, the mods of the modpack have to be in `mods` already. This imports the mod of the
+    generator, the world can't exist without it."""
+    generator = get_mod_item(mods, modpack["generator"])(modpack.get("generator_config"))
+    return World(generator, modpack["gravity"], modpack.get("save"), modpack.get("view_distance", 64),
+                 workers=modpack.get("workers", os.cpu_count()),
+                 tick_rate=modpack.get("tick_rate", 60),
+                 max_ticks_per_frame=modpack.get("max_ticks_per_frame", 5))
+
+
 class PlayScene(Scene):
     def __init__(self, title="Minecraft 2d", resolution=(640, 480), frame_rate=60):
         super().__init__(title, resolution, frame_rate)
@@ -21,6 +35,10 @@ class PlayScene(Scene):
         self.player = None
         self.scroll: Tuple[int, int] = [0, 1600]
         self.dt = 0
+        self.input: Input = Input()
+        self.recorder: RecordingInput = None
+        self.overlay: Overlay = None
+        self._drawn = False
 
     def on_enter(self, previous_scene):
         super(PlayScene, self).on_enter(previous_scene)
@@ -28,30 +46,83 @@ class PlayScene(Scene):
             raise TypeError("Previous scene does not have mods")
         if not hasattr(previous_scene, "selected_modpack"):
             raise TypeError("Previous scene does not have modpack")
-        self.modpack: Dict[str:Any] = previous_scene.selected_modpack
-        self.mods: Dict[str:module] = previous_scene.mods
-        self.mods.update({n: import_module("mods.{}".format(n)) for n in self.modpack["mods"] if n not in self.mods})
+        self.load(previous_scene.selected_modpack, previous_scene.mods)
+        self.player.prewarm(background=True)
+        if self.modpack.get("profile"):
+            self.toggle_profiling()
+
+    def load(self, modpack: Dict[str, Any], mods: Dict[str, Any]):
+        """Creates the world, the controllers and the player of `modpack`, which imports the mods they are in.
+        The other mods of the modpack stay lazy until something of them is needed. With `"record": path` in the modpack
+        the input is recorded and written to path when the scene is left, see recording.py."""
+        if modpack.get("record"):
+            # generating in the background and loading a save would make the session depend on more than the input
+            modpack = dict(modpack, workers=0, save=None)
+        self.modpack: Dict[str:Any] = modpack
+        self.mods: Dict[str:module] = mods
+        self.mods.update(loader.load(n for n in self.modpack["mods"] if n not in self.mods))
 
-        self.world: World = World(get_mod_item(self.mods, self.modpack["generator"])(), self.modpack["gravity"])
+        self.world: World = create_world(self.modpack, self.mods)
         self.controller: List[ControlHandler] = [get_mod_item(self.mods, c)(self) for c in self.modpack["controller"]]
         self.player: Object = get_mod_item(self.mods, self.modpack["player"][0])((0, 0))
         self.player.pos = self.modpack["player"][1]
-        self.world.add(self.player)
+        self.world.track(self.player)
         self.i = 0
+        if modpack.get("record"):
+            # drawing would load the columns around the player in its own order before the first tick
+            self.world.preload()
+            self.recorder = self.input = RecordingInput(self, self.input)
+
+    def on_exit(self, next_scene):
+        super(PlayScene, self).on_exit(next_scene)
+        if self.recorder is not None:
+            self.recorder.save(self.modpack["record"])
+        self.world.close()
+
+    def toggle_profiling(self):
+        profiler.enabled = not profiler.enabled
+        self.overlay = Overlay() if profiler.enabled else None
 
     def handle_event(self, event):
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+            self.toggle_profiling()
+        if self.recorder is not None:
+            self.recorder.event(event)
         for con in self.controller:
             con.handle(event)
 
+    def _tick(self, dt):
+        with profiler.span("scene.controllers"):
+            for con in self.controller:
+                con.update(dt)
+
+    def _ticked(self):
+        # before the events of the next tick are handled, that's where a replay is at after a tick as well
+        if self.recorder is not None:
+            self.recorder.checkpoint()
+
+    @profiler.timed("scene.update")
     def update(self, dt):
         self.i += 1
         dt *= 0.001
-        self.world.update(dt)
+        self.world.advance(dt, self._tick, self._ticked)
         self.dt += dt
-        for con in self.controller:
-            con.update(dt)
 
     def draw(self, screen: pygame.Surface):
+        with profiler.span("scene.draw"):
+            self._draw(screen)
+        if self.overlay is not None:
+            self.overlay.draw(screen)
+        if not self._drawn:
+            self._drawn = True
+            loader.mark("first frame")
+            # the startup timings, with "profile" in the modpack
+            if profiler.enabled:
+                print(loader.report(), file=sys.stderr)
+
+    def _draw(self, screen: pygame.Surface):
+        for con in self.controller:
+            con.frame(self.world.alpha)
         screen.fill((0, 136, 255))
         img, l = self.world.image((int(self.scroll[0] // 16), int((self.scroll[0] + self.application.resolution[0]) // 16 + 2)),
                                   (int(self.scroll[1] // 16), int((self.scroll[1] + self.application.resolution[1]) // 16 + 2)))